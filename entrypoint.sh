@@ -8,6 +8,8 @@ set -e
 # Server Configuration
 export HOST="${HOST:-0.0.0.0}"
 export PORT="${PORT:-8080}"
+# Keep a single worker process: the DuckDB file is opened read-write by the app and DuckDB allows
+# only one writer process per file. Concurrency comes from the async event loop + threadpool instead.
 export WORKERS="${WORKERS:-1}"
 
 # Database Configuration
@@ -1,15 +1,26 @@
-from datetime import datetime, UTC
+from datetime import datetime, date, timedelta, UTC
 
 from prefect import flow, task
+from prefect.task_runners import ConcurrentTaskRunner
+from prefect.tasks import task_input_hash
 
+# extract/transform are idempotent per partition: reruns within the window reuse stored results
+PARTITION_CACHE_EXPIRATION = timedelta(hours=1)
 
-@task
-def extract():
+
+def date_partitions(days_back: int) -> list[date]:
+    """ One partition per day: today and the previous days_back - 1 days """
+    today = datetime.now(tz=UTC).date()
+    return [today - timedelta(days=i) for i in range(max(days_back, 1))]
+
+
+@task(cache_key_fn=task_input_hash, cache_expiration=PARTITION_CACHE_EXPIRATION, persist_result=True)
+def extract(partition: date):
     # заглушка для демо
-    return {"rows": 123, "date": datetime.now(tz=UTC).isoformat()}
+    return {"rows": 123, "date": partition.isoformat()}
 
 
-@task
+@task(cache_key_fn=task_input_hash, cache_expiration=PARTITION_CACHE_EXPIRATION, persist_result=True)
 def transform(payload):
     payload["rows_transformed"] = payload["rows"] * 2
     return payload
@@ -21,13 +32,13 @@ def load(payload):
     return f"Loaded {payload['rows_transformed']} rows on {payload['date']}"
 
 
-@flow(name="daily_sales")
+@flow(name="daily_sales", task_runner=ConcurrentTaskRunner())
 def daily_sales_flow(days_back: int = 1):
-    _ = days_back
-    data = extract()
-    data2 = transform(data)
-    result = load(data2)
-    return result
+    # partitions are independent: extract -> transform -> load fan out per day
+    extracted = extract.map(date_partitions(days_back))
+    transformed = transform.map(extracted)
+    loaded = load.map(transformed)
+    return [future.result() for future in loaded]
 
 
 if __name__ == "__main__":
@@ -1,15 +1,17 @@
 import functools
+import heapq
 import re
+from pathlib import Path
 
 from src.config import settings
-from src.provider import complete
+from src.provider import complete, forget_completion
 
 SYSTEM_PROMPT = """
 You convert user questions to a single SAFE SQL SELECT for DuckDB. For Russian and English languages.
 Rules:
 - Output ONLY a SQL code block (```sql ... ```), no prose.
 - SELECT only. FORBIDDEN: INSERT/UPDATE/DELETE/DDL/ATTACH/COPY.
-- Always include explicit column list and LIMIT {settings.sql.row_limit} if not aggregating large sets.
+- Always include explicit column list and LIMIT {row_limit} if not aggregating large sets.
 - Use ISO timestamps; for year filters use BETWEEN y-01-01 AND (y+1)-01-01.
 Schema:
 {schema_docs}
@@ -25,20 +27,59 @@ ORDER BY revenue DESC
 LIMIT 5;
 """
 
+TOKEN_RE = re.compile(r"[A-Za-zА-Яа-я0-9_]+")
+NORMALIZE_RE = re.compile(r"\s+|г\.|года")
+NORMALIZE_REPLACEMENTS = {"г.": "year", "года": "year"}
+# substrings that hint at a time filter in the question
+TIME_HINT_RE = re.compile(r"год|месяц|quarter|year|month|дата|в 202|за 202", re.IGNORECASE)
+
 
-@functools.lru_cache(maxsize=32)
 def load_schema_docs() -> str:
-    with open(settings.database.dir / "schema_docs.md", "r", encoding="utf-8") as f:
+    """ schema_docs.md, re-read only when its mtime changes (one stat per call) """
+    path = settings.database.dir / "schema_docs.md"
+    return _read_schema_docs(path, path.stat().st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=4)
+def _read_schema_docs(path: Path, mtime_ns: int) -> str:
+    with open(path, "r", encoding="utf-8") as f:
         return f.read()
 
 
-async def nl_to_sql(question: str, row_limit: int) -> str:
-    system = SYSTEM_PROMPT.format(schema_docs=load_schema_docs(), row_limit=str(row_limit))
-    user = f"Q: {question}\nSQL:\n"
-    out = await complete(system, user)
+def system_prompt_for(row_limit: int) -> str:
+    """ The formatted system prompt only depends on the schema docs and the row limit """
+    return _system_prompt(load_schema_docs(), row_limit)
+
+
+@functools.lru_cache(maxsize=16)
+def _system_prompt(schema_docs: str, row_limit: int) -> str:
+    # schema_docs is the cached string object itself: the key lookup is an identity check, not a text compare
+    return SYSTEM_PROMPT.format(schema_docs=schema_docs, row_limit=str(row_limit))
+
+
+def clear_schema_cache() -> None:
+    """ Drop cached schema docs and the system prompts built from them
+        (an edit within the filesystem's mtime granularity is not seen by the mtime key)
+    """
+    _read_schema_docs.cache_clear()
+    _system_prompt.cache_clear()
+
+
+def _nl_to_sql_user(question: str) -> str:
+    return f"Q: {question}\nSQL:\n"
+
+
+async def nl_to_sql(question: str, row_limit: int, cache: bool = True) -> str:
+    system = system_prompt_for(row_limit)
+    out = await complete(system, _nl_to_sql_user(question), cache=cache)
     return out
 
 
+def forget_nl_to_sql(question: str, row_limit: int) -> None:
+    """ Drop the cached answer of nl_to_sql: the same question must not get the failed SQL again """
+    forget_completion(system_prompt_for(row_limit), _nl_to_sql_user(question))
+
+
 async def refine(question: str, sql_md: str, feedback: str | None) -> str:
     """
     Simple refine strategy:
@@ -50,40 +91,56 @@ async def refine(question: str, sql_md: str, feedback: str | None) -> str:
     if feedback:
         hint = (f"\nConstraints: Fix issue -> {feedback}. Keep it a single safe SELECT for DuckDB. Prefer simpler "
                 f"joins, ensure reasonable LIMIT.")
+    # refine is only called after the previous answer failed: the cached first answer is dropped,
+    # and retries always go to the provider (the prompt has no failing SQL, a cached reply would repeat it)
+    forget_nl_to_sql(question, settings.sql.row_limit)
     # Ask the model again with the same limit (used inside nl_to_sql)
-    improved_md = await nl_to_sql(question + hint, row_limit=100)
+    improved_md = await nl_to_sql(question + hint, row_limit=100, cache=False)
     return improved_md
 
 
 def normalize_question(q: str) -> str:
-    q = q.strip()
-    q = re.sub(r"\s+", " ", q)
-    # simple normalization of numbers/years
-    q = q.replace("г.", "year").replace("года", "year")
-    return q
+    # one pass: collapse whitespace runs + simple normalization of numbers/years
+    return NORMALIZE_RE.sub(lambda m: NORMALIZE_REPLACEMENTS.get(m.group(0), " "), q.strip())
 
 
 def _extract_tokens(text: str) -> list[str]:
-    return re.findall(r"[A-Za-zА-Яа-я0-9_]+", text.lower())
+    return TOKEN_RE.findall(text.lower())
 
 
-def similar_fields(q: str, schema_docs: str, topk: int = 5) -> list[str]:
+@functools.lru_cache(maxsize=4)
+def _schema_index(schema_docs: str) -> tuple[tuple[str, ...], dict[str, tuple[int, ...]]]:
     """
-    Simplest "semantic" token matching:
-    - Take question tokens
-    - Find field/table description lines in schema_docs with the maximum token overlap
+    Tokenizes schema_docs once:
+    - lines: non-empty description lines (stripped, cut to 120 chars)
+    - postings: inverted index token -> ids of the lines containing it
     """
-    q_tokens = set(_extract_tokens(q))
-    best: list[tuple[int, str]] = []
+    lines: list[str] = []
+    postings: dict[str, list[int]] = {}
     for line in schema_docs.splitlines():
         tokens = set(_extract_tokens(line))
         if not tokens:
             continue
-        score = len(q_tokens & tokens)
-        if score > 0:
-            best.append((score, line.strip()[:120]))
-    best.sort(key=lambda x: (-x[0], x[1]))
-    return [b[1] for b in best[:topk]]
+        line_id = len(lines)
+        lines.append(line.strip()[:120])
+        for token in tokens:
+            postings.setdefault(token, []).append(line_id)
+    return tuple(lines), {token: tuple(ids) for token, ids in postings.items()}
+
+
+def similar_fields(q: str, schema_docs: str, topk: int = 5) -> list[str]:
+    """
+    Simplest "semantic" token matching:
+    - Take question tokens
+    - Find field/table description lines in schema_docs with the maximum token overlap
+    """
+    lines, postings = _schema_index(schema_docs)
+    scores: dict[int, int] = {}
+    for token in set(_extract_tokens(q)):
+        for line_id in postings.get(token, ()):
+            scores[line_id] = scores.get(line_id, 0) + 1
+    best = heapq.nsmallest(topk, scores, key=lambda line_id: (-scores[line_id], lines[line_id]))
+    return [lines[line_id] for line_id in best]
 
 
 async def make_plan(question: str, schema_docs: str | None = None) -> str:
@@ -101,7 +158,7 @@ async def make_plan(question: str, schema_docs: str | None = None) -> str:
         bullets.append("Key fields/tables: " + ", ".join(fields))
     # simple heuristic about time
     # todo: move to dedicated object
-    if any(k in qn.lower() for k in ["год", "месяц", "quarter", "year", "month", "дата", "в 202", "за 202"]):
+    if TIME_HINT_RE.search(qn):
         bullets.append("Add a period filter, use ISO dates and BETWEEN y-01-01 AND (y+1)-01-01")
     # todo: add more specific Nl -> SQL things that can be extracted from the question
     bullets.append("Output: explicit list of columns, reasonable LIMIT")
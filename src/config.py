@@ -4,22 +4,46 @@ Robust, extensible, and testable settings configuration using Pydantic YamlConfi
 This module provides type-safe configuration management with automatic validation,
 environment variable support, YAML file support, and easy testing capabilities.
 """
+import copy
 import logging
 import os
+from functools import cached_property
 from pathlib import Path
-from typing import Literal, Any
+from typing import Annotated, Literal, Any
 
 import yaml
-from pydantic import BaseModel, Field, field_validator, model_validator
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, field_validator, model_validator
 from pydantic_settings import SettingsConfigDict
 
+try:
+    from yaml import CSafeLoader as SafeLoader  # libyaml (C) parser
+except ImportError:
+    from yaml import SafeLoader
+
 ProjectRootPath = Path(__file__).parents[1]
 DemoDataPath = ProjectRootPath / "demo_data"
 
+# Read-only YAML snapshots: immutable, and the core schema is built on first validation, not at import
+SECTION_CONFIG = ConfigDict(frozen=True, defer_build=True)
+
+# Shared constrained types: one core schema each instead of a validator per section
+type Port = Annotated[int, Field(ge=1, le=65535)]
+type PosInt = Annotated[int, Field(gt=0)]
+type PosFloat = Annotated[float, Field(gt=0)]
+type PathField = Annotated[Path, BeforeValidator(lambda v: v if v is None or isinstance(v, Path) else Path(v))]
+type PathOpt = PathField | None
+type LogLevel = Annotated[
+    Literal['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+    BeforeValidator(lambda v: v.upper() if isinstance(v, str) else v),
+]
+
 
 class DatabaseConfig(BaseModel):
     """Database-related configuration settings."""
 
+    # Frozen: the derived connection values below are computed once and cached
+    model_config = ConfigDict(frozen=True)
+
     # Database type selection
     database_type: Literal["duckdb", "postgresql"] = Field(
         default="duckdb",
@@ -29,29 +53,37 @@ class DatabaseConfig(BaseModel):
 
     # DuckDB (maybe, SQLite?) configuration
     file_name: str | None = Field(None, description="Database file name for DuckDB")
-    dir: Path | None = Field(None, description="Database directory path for DuckDB")
+    dir: PathOpt = Field(None, description="Database directory path for DuckDB")
+    read_only: bool = Field(
+        False,
+        description=(
+            "Open the DuckDB file read-only (query-only processes; they can share the file only with each other, "
+            "not while a read-write process holds its lock). The schema must already be up to date"
+        )
+    )
+    # Conservative caps by default: NL->SQL queries run on the app's own database, not on a separate connection
+    threads: PosInt | None = Field(2, description="DuckDB worker threads (null: all cores)")
+    memory_limit: str | None = Field("512MB", description="DuckDB memory limit, e.g. '4GB' (null: 80% of RAM)")
+    preserve_insertion_order: bool = Field(
+        False,
+        description="Keep insertion order for queries without ORDER BY (costs memory on large scans / loads)"
+    )
+    temp_directory: PathOpt = Field(None, description="DuckDB spill-to-disk directory (put it on a fast volume)")
+    extensions: tuple[str, ...] = Field(
+        ("parquet", "json"),
+        description="DuckDB extensions loaded at connect time, installed only when missing (e.g. httpfs for S3)"
+    )
 
     # Relational database configuration
     host: str | None = Field(None, description="Relational database host")
-    port: int | None = Field(None, description="Relational database port")
+    port: Port | None = Field(None, description="Relational database port")
     database: str | None = Field(None, description="Relational database name")
     user: str | None = Field(None, description="Relational database username")
     password: str | None = Field(None, description="Relational database password")
     autocommit: bool = Field(True)
-
-    @field_validator('dir', mode='before')
-    @classmethod
-    def validate_db_dir(cls, v):
-        if v is None:
-            return None
-        return Path(v) if not isinstance(v, Path) else v
-
-    @field_validator('port')
-    @classmethod
-    def validate_port(cls, v):
-        if v is not None and not (1 <= v <= 65535):
-            raise ValueError("Relational database port must be between 1 and 65535")
-        return v
+    pool_min_size: PosInt = Field(1, description="PostgreSQL connection pool: connections kept open")
+    pool_max_size: PosInt = Field(25, description="PostgreSQL connection pool: upper bound of connections")
+    pool_timeout: PosFloat = Field(30.0, description="PostgreSQL connection pool: seconds to wait for a free connection")
 
     @model_validator(mode='after')
     def validate_database_config(self):
@@ -64,10 +96,12 @@ class DatabaseConfig(BaseModel):
                 raise ValueError("Database directory is required when using duckdb database type")
         return self
 
+    @cached_property
     def duck_db_path(self) -> str:
         """Build DuckDB (Or SQLite) connection string."""
-        return str(Path(self.dir) / self.file_name)
+        return str(self.dir / self.file_name)
 
+    @cached_property
     def postgresql_dsn(self) -> str:
         """Build PostgreSQL (or MySQL or Greenplum and so on) connection string."""
         if not self.password:
@@ -75,6 +109,18 @@ class DatabaseConfig(BaseModel):
 
         return f"{self.database_type}://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
 
+    @cached_property
+    def duckdb_config(self) -> dict[str, Any]:
+        """duckdb.connect(config=...) options; unset values keep DuckDB defaults."""
+        config = {
+            "threads": self.threads,
+            "memory_limit": self.memory_limit,
+            "preserve_insertion_order": self.preserve_insertion_order,
+            "temp_directory": str(self.temp_directory) if self.temp_directory else None,
+        }
+        return {key: value for key, value in config.items() if value is not None}
+
+    @cached_property
     def postgresql_parameters(self) -> dict[str, Any]:
         return {
             "host": self.host,
@@ -88,21 +134,16 @@ class DatabaseConfig(BaseModel):
 class SQLConfig(BaseModel):
     """SQL execution configuration settings."""
 
-    row_limit: int = Field(default=200, description="Default row limit for queries")
-    query_timeout_ms: int = Field(default=8000, description="Query timeout in milliseconds")
+    model_config = SECTION_CONFIG
 
-    @field_validator('row_limit', 'query_timeout_ms')
-    @classmethod
-    def validate_positive_int(cls, v):
-        if v <= 0:
-            raise ValueError("Value must be positive")
-        return v
+    row_limit: PosInt = Field(default=200, description="Default row limit for queries")
+    query_timeout_ms: PosInt = Field(default=8000, description="Query timeout in milliseconds")
 
 
 class LLMConfig(BaseModel):
     """Large Language Model configuration settings."""
 
-    provider: Literal["openai", "openrouter", "ollama"] = Field(
+    provider: Literal["openai", "openrouter", "ollama", "vllm"] = Field(
         default="openai",
         description="LLM provider to use"
     )
@@ -110,77 +151,41 @@ class LLMConfig(BaseModel):
     openai_api_key: str | None = Field(default=None, description="OpenAI API key")
     openrouter_api_key: str | None = Field(default=None, description="OpenRouter API key")
     ollama_base_url: str = Field(default="http://localhost:11434", description="Ollama base URL")
-
-    @model_validator(mode='after')
-    def validate_api_keys(self):
-        provider = self.provider.lower()
-        openai_key = self.openai_api_key
-        openrouter_key = self.openrouter_api_key
-
-        # Only validate API keys if they are actually needed for runtime
-        # This allows initialization without keys, but they should be provided before use
-        if provider == 'openai' and not openai_key:
-            logging.warning(
-                "OPENAI_API_KEY is not set but OpenAI provider is selected. "
-                "Set the API key before making requests."
-            )
-        elif provider == 'openrouter' and not openrouter_key:
-            logging.warning(
-                "OPENROUTER_API_KEY is not set but OpenRouter provider is selected. "
-                "Set the API key before making requests."
-            )
-
-        return self
+    vllm_base_url: str = Field(default="http://localhost:8001", description="vLLM OpenAI-compatible server base URL")
 
 
 class ServerConfig(BaseModel):
     """Server configuration settings."""
 
-    host: str = Field(default="0.0.0.0", description="Server host address")
-    port: int = Field(default=8000, description="Server port")
+    model_config = SECTION_CONFIG
 
-    @field_validator('port')
-    @classmethod
-    def validate_port(cls, v):
-        if not (1 <= v <= 65535):
-            raise ValueError("Port must be between 1 and 65535")
-        return v
+    host: str = Field(default="0.0.0.0", description="Server host address")
+    port: Port = Field(default=8000, description="Server port")
 
 
 class LoggingConfig(BaseModel):
     """Logging configuration settings."""
 
-    level: str = Field(default="INFO", description="Logging level")
+    model_config = SECTION_CONFIG
+
+    level: LogLevel = Field(default="INFO", description="Logging level")
     format: str = Field(
         default="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
         description="Log message format"
     )
     datefmt: str = Field(default="%Y-%m-%d %H:%M:%S", description="Date format for logs")
 
-    @field_validator('level')
-    @classmethod
-    def validate_log_level(cls, v):
-        valid_levels = {'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'}
-        if v.upper() not in valid_levels:
-            raise ValueError(f"Invalid log level. Must be one of: {valid_levels}")
-        return v.upper()
-
 
 class GitConfig(BaseModel):
     """Git and DBT configuration settings."""
 
-    dbt_dir: Path = Field(default=Path("dbt"), description="DBT project directory")
+    dbt_dir: PathField = Field(default=Path("dbt"), description="DBT project directory")
     github_token: str | None = Field(default=None, description="GitHub API token")
     github_repo: str | None = Field(default=None, description="GitHub repository (owner/repo)")
     default_branch: str = Field(default="main", description="Default Git branch")
     author_name: str = Field(default="Data Platform Copilot", description="Git author name")
     author_email: str = Field(default="bot@example.com", description="Git author email")
 
-    @field_validator('dbt_dir', mode='before')
-    @classmethod
-    def validate_dbt_dir(cls, v):
-        return Path(v) if not isinstance(v, Path) else v
-
     @field_validator('github_repo')
     @classmethod
     def validate_github_repo(cls, v):
@@ -192,23 +197,9 @@ class GitConfig(BaseModel):
 class DataQualityConfig(BaseModel):
     """Data Quality configuration settings."""
 
-    default_limit: int = Field(default=10000, description="Default row limit for profiling")
-    max_limit: int = Field(default=200000, description="Maximum row limit safety guard")
-    default_sigma: float = Field(default=3.0, description="Default sigma for z-score")
-
-    @field_validator('default_limit', 'max_limit')
-    @classmethod
-    def validate_positive_int(cls, v):
-        if v <= 0:
-            raise ValueError("Value must be positive")
-        return v
-
-    @field_validator('default_sigma')
-    @classmethod
-    def validate_positive_float(cls, v):
-        if v <= 0:
-            raise ValueError("Sigma must be positive")
-        return v
+    default_limit: PosInt = Field(default=10000, description="Default row limit for profiling")
+    max_limit: PosInt = Field(default=200000, description="Maximum row limit safety guard")
+    default_sigma: PosFloat = Field(default=3.0, description="Default sigma for z-score")
 
     @model_validator(mode='after')
     def validate_limits(self):
@@ -217,29 +208,26 @@ class DataQualityConfig(BaseModel):
         return self
 
 
-class DataConfig(BaseModel):
-    """Data directory and file configuration settings."""
-
-    data_dir: Path | None = Field(default=None, description="Data directory path")
-
-    @field_validator('data_dir', mode='before')
-    @classmethod
-    def validate_data_dir(cls, v):
-        if v is None:
-            return None
-        return Path(v) if not isinstance(v, Path) else v
-
-
 class OrchestrationConfig(BaseModel):
     """Orchestration configuration settings."""
 
+    model_config = SECTION_CONFIG
+
     prefect_api: str = Field(default="http://localhost:4200/api", description="Prefect API URL")
 
 
+# Secrets never leave the process through summaries / debug dumps
+SENSITIVE_FIELDS: dict[str, set[str]] = {
+    'database': {'password'},
+    'llm': {'openai_api_key', 'openrouter_api_key'},
+    'git': {'github_token'},
+}
+
+
 class Settings(BaseModel):
     """Main settings class that combines all configuration sections."""
 
-    model_config = SettingsConfigDict()
+    model_config = SettingsConfigDict(defer_build=True)
 
     database: DatabaseConfig = Field(default_factory=DatabaseConfig)
     sql: SQLConfig = Field(default_factory=SQLConfig)
@@ -248,61 +236,82 @@ class Settings(BaseModel):
     logging: LoggingConfig = Field(default_factory=LoggingConfig)
     git: GitConfig = Field(default_factory=GitConfig)
     data_quality: DataQualityConfig = Field(default_factory=DataQualityConfig)
-    data: DataConfig = Field(default_factory=DataConfig)
     orchestration: OrchestrationConfig = Field(default_factory=OrchestrationConfig)
 
     def get_config_summary(self) -> dict[str, dict[str, Any]]:
         """Get a summary of all configuration values (excluding sensitive data)."""
-        # summary = {}
-        # for section_name in ['database', 'sql', 'llm', 'server', 'logging', 'git', 'data_quality', 'data',
-        #                      'orchestration']:
-        #     section = getattr(self, section_name)
-        #     summary[section_name] = section.model_dump()
+        # A copy: callers may change the returned dict, the cached dump is shared by all of them
+        return copy.deepcopy(self._config_summary)
 
-        return self.model_dump()
+    @cached_property
+    def _config_summary(self) -> dict[str, dict[str, Any]]:
+        """Sanitized dump built once: settings are not changed after load."""
+        return self.model_dump(mode='json', exclude=SENSITIVE_FIELDS)
+
+    def config_summary_json(self, indent: int | None = None) -> str:
+        """Same summary serialized by pydantic-core directly (no intermediate dict / json module)."""
+        return self.model_dump_json(indent=indent, exclude=SENSITIVE_FIELDS)
 
     def validate_required_settings(self):
-        """Validate that all required settings for the current configuration are present."""
-        try:
-            # This will trigger validation of all sections, including API keys based on provider
-            _ = self.llm
-            return True
-        except Exception as e:
-            raise ValueError(f"Configuration validation failed: {str(e)}")
+        """Validate that all required settings for the current configuration are present (run once at startup)."""
+        # Keys are only needed at request time, so a missing one is a warning, not a load error
+        provider = self.llm.provider
+        if provider == 'openai' and not self.llm.openai_api_key:
+            logging.warning(
+                "OPENAI_API_KEY is not set but OpenAI provider is selected. "
+                "Set the API key before making requests."
+            )
+        elif provider == 'openrouter' and not self.llm.openrouter_api_key:
+            logging.warning(
+                "OPENROUTER_API_KEY is not set but OpenRouter provider is selected. "
+                "Set the API key before making requests."
+            )
+        return True
 
     @classmethod
     def from_yaml(cls, yaml_file: Path, yaml_file_encoding: str = 'utf-8') -> 'Settings':
         with yaml_file.open('r', encoding=yaml_file_encoding) as f:
-            config_file = yaml.load(f, yaml.SafeLoader)
+            config_file = yaml.load(f, SafeLoader)
 
         instance = cls.model_validate(config_file)
         return instance
 
 
 ENV_PATH = os.getenv("ENV_PATH", '.env.yaml')
-# Create a global settings instance
-settings = Settings.from_yaml(
-    yaml_file=Path(ENV_PATH),
-    yaml_file_encoding='utf-8',
-)
+
+
+def get_settings() -> Settings:
+    """Build the global settings instance on first use (YAML I/O + validation are deferred until needed)."""
+    if (instance := globals().get('settings')) is None:
+        instance = Settings.from_yaml(
+            yaml_file=Path(ENV_PATH),
+            yaml_file_encoding='utf-8',
+        )
+        # Later `src.config.settings` lookups hit the module dict directly, bypassing __getattr__
+        globals()['settings'] = instance
+    return instance
+
+
+def __getattr__(name: str) -> Any:
+    """Lazy module attribute (PEP 562): `from src.config import settings` loads the YAML on first import."""
+    if name == 'settings':
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def inspect_settings() -> dict[str, dict[str, Any]]:
     """Inspect the current settings configuration (useful for debugging and documentation)."""
-    return settings.get_config_summary()
+    return get_settings().get_config_summary()
 
 
 if __name__ == "__main__":
     # Example usage and inspection
     print("=== Settings Configuration Summary ===")
-    import json
-
-    json_result = inspect_settings()
-    print(json.dumps(json_result, indent=2, default=str))
+    print(get_settings().config_summary_json(indent=2))
 
     print("\n=== Validating Configuration ===")
     try:
-        settings.validate_required_settings()
+        get_settings().validate_required_settings()
         print("✓ Configuration is valid")
     except Exception as e:
         print(f"✗ Configuration error: {e}")
@@ -1,34 +1,97 @@
 """ Module is required for correctly working versioning tools """
 
+import hashlib
 import logging
 
-from duckdb.duckdb import CatalogException
-
+from src.config import get_settings
 from .base_model import DatabaseObject
-from .db_connector import ConnectionCM
+from .db_connector import ConnectionCM, ConnectionType, DatabaseError, run_batch
 from .models import Namespace, NamespaceNameModel, NamespaceNameModel
 
 
+# Rendered (statements, schema version) per (default_schema, with_drop): the model set and DDL do not change at runtime
+_SCRIPTS: dict[tuple[str, bool], tuple[list[str], str]] = {}
+# (database connection, default_schema) pairs already created by this process
+_CREATED: set[tuple[int, str]] = set()
+
+SCHEMA_VERSION_TABLE = "dp_schema_version"
+
+
+def _schema_script(db_instances: list[DatabaseObject], with_drop: bool) -> tuple[list[str], str]:
+    schema = db_instances[0].default_schema
+    if (script := _SCRIPTS.get((schema, with_drop))) is None:
+        schema_ddl = [ddl for db_instance in db_instances for ddl in db_instance.ddl_statements()]
+        schema_ddl.extend(
+            default_data for db_instance in db_instances if (default_data := db_instance.default_data())
+        )
+        # The version is the hash of the DDL itself: any change of a model's DDL re-runs the script
+        version = hashlib.blake2b("\n".join(schema_ddl).encode(), digest_size=16).hexdigest()
+
+        # Explicit transaction: the connections run in autocommit, where every statement of a batch commits alone
+        # The schema itself first: a fresh database has none and every DDL below is schema-qualified
+        statements = ["begin transaction", f"create schema if not exists {schema}"]
+        if with_drop:
+            # Dependents first
+            statements.extend(db_instance.drop_sql() for db_instance in reversed(db_instances))
+        statements.extend(schema_ddl)
+        statements.extend((
+            f"create table if not exists {schema}.{SCHEMA_VERSION_TABLE} (version VARCHAR(64) NOT NULL)",
+            f"delete from {schema}.{SCHEMA_VERSION_TABLE}",
+            f"insert into {schema}.{SCHEMA_VERSION_TABLE} (version) values ('{version}')",
+            "commit",
+        ))
+        script = _SCRIPTS[(schema, with_drop)] = (statements, version)
+    return script
+
+
+def _stored_schema_version(connection: ConnectionType, schema: str) -> str | None:
+    try:
+        if isinstance(connection, ConnectionType):
+            row = connection.execute(f"select version from {schema}.{SCHEMA_VERSION_TABLE}").fetchone()
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(f"select version from {schema}.{SCHEMA_VERSION_TABLE}")
+                row = cursor.fetchone()
+    except Exception:
+        # No version table yet: a database created before the gate or an empty one
+        if not isinstance(connection, ConnectionType):
+            connection.rollback()
+        return None
+    return row[0] if row else None
+
+
 def create_all(cm_manager: ConnectionCM, with_drop: bool = False) -> None:
-    """ Creating required tables and objects in the assigned database and default data """
+    """ Creating required tables and objects in the assigned database and default data
+        Without with_drop, the script is skipped when the stored schema version matches,
+        and a second call for the same database and schema in this process does nothing at all
+    """
+    objects_order = tuple(DatabaseObject._registry)  # sorted by dependency_order
+    created_key = (id(cm_manager.db_connection), get_settings().database.default_schema)
+    if not with_drop and created_key in _CREATED:
+        return
+
+    database_settings = get_settings().database
+    read_only = database_settings.database_type == "duckdb" and database_settings.read_only
+
     with cm_manager as connection:
-        if with_drop:
-            objects_order = DatabaseObject.__subclasses__()
-            try:
-                for db_cls in objects_order:
-                    db_cls(connection).drop_ddl()
-            except CatalogException:
-                for db_cls in objects_order[::-1]:
-                    db_cls(connection).drop_ddl()
-
-        for db_cls in DatabaseObject.__subclasses__():
-            db_instance = db_cls(connection)
-            db_instance.execute_ddl()
-            logging.info(f"{db_instance.name}: DDL executed")
-            if default_data := db_instance.default_data():
-                connection.execute(default_data)
-                connection.commit()
-                logging.info(f"{db_instance.name}: default data inserted")
+        db_instances = [db_cls(connection) for db_cls in objects_order]
+        statements, version = _schema_script(db_instances, with_drop)
+        stored = None if with_drop else _stored_schema_version(connection, created_key[1])
+        if stored == version:
+            logging.info(f"Schema version {version} is up to date, DDL skipped")
+        elif read_only:
+            # A read-only file cannot take the DDL: the read-write app must create/upgrade the schema first
+            raise DatabaseError(
+                f"Database is read-only and its schema version is {stored or 'missing'} (expected {version}): "
+                f"start the read-write app once to create or upgrade the schema"
+            )
+        else:
+            # Drops, DDL and default data: one multi-statement batch, one transaction, one commit
+            run_batch(connection, statements)
+            for db_cls in objects_order:
+                db_cls.invalidate_cache()
+            logging.info(f"DDL and default data executed: {', '.join(db_instance.name for db_instance in db_instances)}")
+    _CREATED.add(created_key)
 
 
 __all__ = [
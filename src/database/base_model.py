@@ -1,22 +1,86 @@
 import abc
+import contextlib
+import functools
 import logging
+import operator
+import sys
 from typing import Any, Callable, Annotated
 
+import pandas as pd
 from fastapi import Depends
 from pydantic import BaseModel
 
-from src.config import settings
+from src.config import get_settings
 from src.database.db_connector import ConnectionType, opened_connection
 
 
 class DatabaseObject[CreateM: BaseModel, FullM: BaseModel](abc.ABC):
     """ Defines interface for required database objects (because SQLAlchemy & alembic support DuckDB badly) """
-    default_schema = settings.database.default_schema
-
     name: str
     autoincrement: str
     model: type[FullM]
 
+    # Lower is created first and dropped last (FK targets before the referencing tables)
+    dependency_order: int = 0
+
+    # Concrete objects, filled by __init_subclass__
+    _registry: list[type['DatabaseObject']] = []
+    # Connections inside transaction(): their reads may see uncommitted rows, so they never fill the caches
+    _transactions: set[int] = set()
+
+    # Per-class constants, precomputed by __init_subclass__; {schema} is filled on first use (settings are lazy)
+    _fields: tuple[str, ...]
+    _construct: Callable[..., FullM]
+    _row_to_model: Callable[[tuple], FullM]
+    _fields_csv: str
+    _select_sql_tpl: str
+    _insert_sql_tpl: str
+    _update_fields: tuple[str, ...]
+    # Read cache of these low-mutation tables, per class; every write through the object drops it
+    _all_cache: list[FullM] | None
+    _get_cache: dict[Any, FullM]
+    # Bumped by every invalidation: a read stores its result only if no invalidation happened while it ran
+    _cache_generation: int
+    _statement_templates: dict[str, str]
+    _statements: dict[str, str]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        DatabaseObject._registry.append(cls)
+        DatabaseObject._registry.sort(key=lambda db_cls: db_cls.dependency_order)
+
+        cls._fields = tuple(sys.intern(name) for name in cls.model.model_fields)
+        cls._construct = cls.model.model_construct
+        cls._row_to_model = staticmethod(_compile_row_to_model(cls._construct, cls._fields))
+        cls._fields_csv = ','.join(cls._fields)
+        cls._select_sql_tpl = f"select {cls._fields_csv} from {{schema}}.{cls.name}"
+        cls._update_fields = tuple(f for f in cls._fields if f not in ("id", "created_at", "updated_at"))
+        cls._statement_templates = {
+            "get": cls._select_sql_tpl + " where id = ?",
+            "all": cls._select_sql_tpl + " order by id",
+            "update": (
+                f"update {{schema}}.{cls.name} "
+                f"set {','.join(f'{f} = ?' for f in cls._update_fields)}, updated_at = CURRENT_TIMESTAMP "
+                f"where id = ? returning {cls._fields_csv}"
+            ),
+            "delete": f"delete from {{schema}}.{cls.name} where id = ?",
+            # The ids go as one LIST parameter: one statement and one round-trip for any number of rows
+            "delete_many": f"delete from {{schema}}.{cls.name} where id in (select unnest(?))",
+        }
+        cls._statements = {}
+        cls._all_cache = None
+        cls._get_cache = {}
+        cls._cache_generation = 0
+        cls._insert_sql_tpl = (
+            f"insert into {{schema}}.{cls.name} (id, {{columns}}) "
+            f"values (nextval('{{autoincrement}}'), {{placeholders}}) "
+            f"returning {cls._fields_csv}"
+        )
+
+    @property
+    def default_schema(self) -> str:
+        return get_settings().database.default_schema
+
     @property
     def autoincrement(self) -> str:
         return f"{self.default_schema}.seq_{self.name}_id_autoincrement"
@@ -24,116 +88,206 @@ class DatabaseObject[CreateM: BaseModel, FullM: BaseModel](abc.ABC):
     def __init__(self, connection: ConnectionType):
         self.connection = connection
 
+    @classmethod
+    def invalidate_cache(cls) -> None:
+        """ Call after changing the table outside insert/update/delete (raw SQL, rolled back transaction) """
+        cls._cache_generation += 1
+        cls._all_cache = None
+        cls._get_cache = {}
+
+    @staticmethod
+    @contextlib.contextmanager
+    def transaction(connection: ConnectionType):
+        """ Explicit transaction: commit on success, rollback on any error, the read caches dropped either way """
+        DatabaseObject._transactions.add(id(connection))
+        connection.begin()
+        try:
+            yield connection
+        except BaseException:
+            connection.rollback()
+            raise
+        else:
+            connection.commit()
+        finally:
+            DatabaseObject._transactions.discard(id(connection))
+            # After commit/rollback: a concurrent read may have cached the pre-transaction snapshot meanwhile
+            for db_cls in DatabaseObject._registry:
+                db_cls.invalidate_cache()
+
+    def _cache_generation_for_fill(self) -> int | None:
+        """ Generation to store a read under, None when the result must not be cached """
+        if id(self.connection) in DatabaseObject._transactions:
+            return None
+        return self._cache_generation
+
+    def _statement(self, key: str) -> str:
+        """ Schema-resolved SQL, rendered once per class: every call sends byte-identical text with ? params """
+        try:
+            return self._statements[key]
+        except KeyError:
+            sql = self._statements[key] = self._statement_templates[key].format(schema=self.default_schema)
+            return sql
+
+    @classmethod
+    @functools.cache
+    def _insert_getter(cls, create_model: type[BaseModel]) -> tuple[tuple[str, ...], Callable[[BaseModel], tuple]]:
+        """ Columns the create model can fill, with a getter returning their values as a tuple """
+        names = tuple(f for f in cls._fields if f != 'id' and f in create_model.model_fields)
+        match names:
+            case ():
+                return names, lambda model: ()
+            case (name,):
+                # attrgetter with a single name returns the bare value, not a tuple
+                return names, lambda model: (getattr(model, name),)
+            case _:
+                return names, operator.attrgetter(*names)
+
     def insert(self, model: CreateM) -> FullM:
+        names, getter = self._insert_getter(type(model))
+        # None means "use the column default"; falsy values like 0 / "" / False are inserted as is
         short_fields = {
             field: field_value
-            for field in self.fields()
-            if (field_value := getattr(model, field, None))
+            for field, field_value in zip(names, getter(model))
+            if field_value is not None
         }
-        sql = f""" 
-            insert into {settings.database.default_schema}.{self.name} (id, {','.join(short_fields)}) 
-            values (nextval('{self.autoincrement}'), {','.join(['?'] * len(short_fields))}) 
-            returning {','.join(self.fields())}
-        """
+        columns = ','.join(short_fields)
+        if (sql := self._statements.get(f"insert({columns})")) is None:
+            sql = self._statements[f"insert({columns})"] = self._insert_sql_tpl.format(
+                schema=self.default_schema,
+                columns=columns,
+                autoincrement=self.autoincrement,
+                placeholders=','.join('?' * len(short_fields)),
+            )
         logging.info(f"SQL: {sql}")
         cursor = self.connection.execute(sql, tuple(short_fields.values()))
         result = cursor.fetchone()
+        self.invalidate_cache()
         return self.create_model_from_tuple(result)
 
-    def get(self, id_: int) -> FullM | None:
-        sql = f""" 
-            select {','.join(self.fields())} 
-            from {settings.database.default_schema}.{self.name} 
-            where id = ? 
+    def insert_many(self, models: list[CreateM]) -> list[FullM]:
+        """ Bulk insert: the rows go to DuckDB as one registered DataFrame and one INSERT ... SELECT
+            Columns that are None for every row keep their defaults, other None values are stored as NULL
         """
+        if not models:
+            return []
+
+        names, getter = self._insert_getter(type(models[0]))
+        frame = pd.DataFrame.from_records([getter(model) for model in models], columns=names)
+        columns = ','.join(name for name in names if frame[name].notna().any())
+        self.connection.register("insert_many_source", frame)
+        try:
+            result_query = self.connection.execute(
+                f"insert into {self.default_schema}.{self.name} (id, {columns}) "
+                f"select nextval('{self.autoincrement}'), {columns} from insert_many_source "
+                f"returning {self._fields_csv}"
+            ).fetchall()
+        finally:
+            self.connection.unregister("insert_many_source")
+        self.invalidate_cache()
+
+        return list(map(self._row_to_model, result_query))
+
+    def get(self, id_: int) -> FullM | None:
+        if (cached := self._get_cache.get(id_)) is not None:
+            # A copy: callers change returned models before update() (and may fail before saving them)
+            return cached.model_copy()
+
+        sql = self._statement("get")
+        generation = self._cache_generation_for_fill()
         logging.info(f"SQL: {sql}")
         executed = self.connection.execute(sql, (id_,))
         if result := executed.fetchone():
-            return self.create_model_from_tuple(result)
+            model = self.create_model_from_tuple(result)
+            if generation is not None and generation == self._cache_generation:
+                self._get_cache[id_] = model
+            return model.model_copy()
 
         return None
 
     def update[FullM: BaseModel](self, model: FullM) -> FullM:
-        update_fields = {
-            f: getattr(model, f)
-            for f in self.fields()
-            if f not in ("id", "created_at", "updated_at")
-        }
         executed = self.connection.execute(
-            f""" 
-                update {settings.database.default_schema}.{self.name}
-                set {','.join(f'{f} = ?' for f in update_fields)}, updated_at = CURRENT_TIMESTAMP
-                where id = ?
-                returning {','.join(self.fields())}
-                """,
-            [*list(update_fields.values()), model.id]
+            self._statement("update"),
+            [*(getattr(model, f) for f in self._update_fields), model.id]
         )
         result = executed.fetchone()
+        self.invalidate_cache()
         return self.create_model_from_tuple(result)
 
     def delete(self, id_: Any, is_cascade: bool = False) -> None:
         raise NotImplementedError
 
-    def all(self) -> list[FullM]:
-        result_query = self.connection.execute(
-            f"""
-                select {','.join(self.fields())}
-                from {settings.database.default_schema}.{self.name}
-                order by id
-            """
-        ).fetchall()
+    def delete_many(self, ids: list[Any]) -> None:
+        if not ids:
+            return
+        self.connection.execute(self._statement("delete_many"), (list(ids),))
+        self.invalidate_cache()
 
-        return [
-            self.create_model_from_tuple(fields)
-            for fields in result_query
-        ]
+    def all(self) -> list[FullM]:
+        if (cached := self._all_cache) is None:
+            generation = self._cache_generation_for_fill()
+            result_query = self.connection.execute(self._statement("all")).fetchall()
+            cached = list(map(self._row_to_model, result_query))
+            if generation is not None and generation == self._cache_generation:
+                type(self)._all_cache = cached
+        # New list and model copies each time: callers may change both without touching the cache
+        return [model.model_copy() for model in cached]
 
     def filter(self, **field_values: Any) -> list[FullM] | None:
         """ AND - based filter on the assigned model """
-        def field_wrap(value: Any) -> str:
-            if isinstance(value, str):
-                return f"'{value}'"
-            return str(value)
-
+        # Values are bound, not inlined: the statement text depends on the filtered columns only
         result_query = self.connection.execute(
-            f"""
-                select {','.join(self.fields())}
-                from {settings.database.default_schema}.{self.name}
-                where {' and '.join(f'{f}={field_wrap(v)}' for f, v in field_values.items())}
-                order by id
-            """
+            self._select_sql_tpl.format(schema=self.default_schema)
+            + f" where {' and '.join(f'{f} = ?' for f in field_values)} order by id",
+            tuple(field_values.values())
         ).fetchall()
 
-        return [
-            self.create_model_from_tuple(fields)
-            for fields in result_query
-        ]
+        return list(map(self._row_to_model, result_query))
 
     # DDL
-    def drop_ddl(self) -> None:
+    def drop_sql(self) -> str:
+        return f"drop table if exists {self.default_schema}.{self.name} cascade"
+
+    def ddl_statements(self) -> list[str]:
         raise NotImplementedError
 
+    def drop_ddl(self) -> None:
+        self.connection.execute(self.drop_sql())
+        self.connection.commit()
+        self.invalidate_cache()
+
     def execute_ddl(self) -> None:
-        raise NotImplementedError
+        self.connection.execute(";\n".join(self.ddl_statements()))
+        self.connection.commit()
 
     def default_data(self) -> str | None:
         ...
 
     # Model operations
     def fields(self) -> tuple[str, ...]:
-        return tuple(self.model.model_fields.keys())
-
-    def create_model_from_tuple(self, row: tuple) -> FullM:
-        return self.model.model_validate(
-            {
-                field_name: row[i]
-                for i, field_name in enumerate(self.fields())
-            }
-        )
+        return self._fields
+
+    def create_model_from_tuple(self, row: tuple, strict: bool = False) -> FullM:
+        """ Rows come from our own tables, so validation is skipped unless strict is requested """
+        if strict:
+            return self.model.model_validate(dict(zip(self._fields, row)))
+        return self._row_to_model(row)
+
+
+def _compile_row_to_model[M: BaseModel](construct: Callable[..., M], fields: tuple[str, ...]) -> Callable[[tuple], M]:
+    """ Row -> model function specialized for one field tuple: constant indexes and keywords, no zip/dict per row
+        e.g. `def row_to_model(row): return construct(id=row[0], name=row[1])`
+    """
+    arguments = ', '.join(f'{field}=row[{index}]' for index, field in enumerate(fields))
+    namespace: dict[str, Any] = {}
+    exec(f"def row_to_model(row): return construct({arguments})", {"construct": construct}, namespace)
+    return namespace["row_to_model"]
 
 
+@functools.cache
 def depends_object[T: DatabaseObject](model: type[T]) -> Callable[[ConnectionType], T]:
-    """ Initialize the DatabaseObject with connection """
+    """ Initialize the DatabaseObject with connection
+        Cached: the same model gets the same dependency callable, so FastAPI resolves it once per request
+    """
 
     def depends_object(
             connection: Annotated[ConnectionType, Depends(opened_connection)],
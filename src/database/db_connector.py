@@ -1,17 +1,30 @@
 import logging
-from functools import lru_cache
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Any, Generator
+from typing import Optional, Any, ClassVar, Generator, Iterable, TYPE_CHECKING
 
 import duckdb
-import psycopg2
 from duckdb import DuckDBPyConnection
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import Retrying, stop_after_attempt, wait_exponential_jitter
 
 from src.config import settings
 
+if TYPE_CHECKING:
+    # psycopg2 is imported only when the postgresql backend is actually built
+    from psycopg2.extensions import connection as PGConnection
+    from psycopg2.pool import ThreadedConnectionPool
+
 ConnectionType = duckdb.DuckDBPyConnection
 
+_singleton_lock = threading.Lock()
+
+# Database file directories already created by this process
+_ENSURED_DIRS: set[Path] = set()
+
+# Health probe statement, a module constant shared by both backends' check_connection
+PROBE_SQL = "SELECT 1"
+
 
 class DatabaseConnection:
     """ Connection main protocol class with the overall interface
@@ -21,6 +34,8 @@ class DatabaseConnection:
     """
     dsn: str
     connection: ConnectionType | None
+    # Connection-test attempts in wait_db_connection(): worth retrying only over the network
+    probe_attempts: int = 3
 
     def create_connection(self) -> None:
         raise NotImplementedError
@@ -34,19 +49,31 @@ class DatabaseConnection:
     def commit(self) -> None:
         pass
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
-    )
+    def acquire(self) -> ConnectionType:
+        """ Connection for one unit of work (a request / a with-block); by default the shared one """
+        if self.connection is None:
+            self.create_connection()
+        return self.connection
+
+    def release(self, connection: ConnectionType, exc: BaseException | None = None) -> None:
+        """ Finish the unit of work started by acquire() """
+        if exc:
+            self.handle_exception(exc)
+            self.close_connection()
+        else:
+            self.commit()
+
     def test_db_connection(self) -> None:
-        """ Test the database connection. """
+        """ Test the database connection (opens it on first use) """
+        connection = self.acquire()
         try:
-            # Simple test query
-            result = self.connection.execute("SELECT 1 as test").fetchone()
+            result = connection.execute(PROBE_SQL).fetchone()
             logging.info("Database is connected")
         except Exception as e:
             logging.error(f"Database connection test failed: {e}")
             raise
+        finally:
+            self.release(connection)
         if result[0] != 1:
             raise RuntimeError("Connection test failed")
 
@@ -54,27 +81,49 @@ class DatabaseConnection:
 class DuckDBContextManager(DatabaseConnection):
     """Simple context manager for DuckDB connections."""
 
+    # Embedded: connect either succeeds or the file is broken, a retry changes nothing
+    probe_attempts = 1
+
     _instance: Optional['DuckDBContextManager'] = None
+    _initialized: bool = False
 
     def __new__(cls, *args, **kwargs) -> 'DuckDBContextManager':
         """Ensure singleton pattern."""
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance.__init__(*args, **kwargs)
+            with _singleton_lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
 
+        # __init__ is invoked by type.__call__ after __new__ and skips an already initialized singleton
         return cls._instance
 
-    def __init__(self, dsn: Optional[str] = None, read_only: bool = False):
+    def __init__(
+            self,
+            dsn: Optional[str] = None,
+            read_only: bool = False,
+            config: dict[str, Any] | None = None,
+            extensions: Iterable[str] = (),
+    ):
         """
         Initialize DuckDB context manager.
         
         Args:
             dsn: Path to DuckDB database file. If None, creates in-memory database.
             read_only: Whether to open database in read-only mode.
+            config: DuckDB options applied at connect time (threads, memory_limit, ...).
+            extensions: Extensions to load right after connecting (installed only when missing).
         """
+        if self._initialized:
+            return
+
+        self._initialized = True
         self.dsn = dsn
         self.read_only = read_only
+        self.config = config or {}
+        self.extensions = tuple(extensions)
         self.connection: Optional[duckdb.DuckDBPyConnection] = None
+        # The first request may race the startup warmup for opening the file
+        self._connect_lock = threading.Lock()
 
         logging.info(f"Initializing DuckDB connection: {self.dsn or 'in-memory'}")
 
@@ -85,22 +134,72 @@ class DuckDBContextManager(DatabaseConnection):
         Returns:
             duckdb.DuckDBPyConnection: Active DuckDB connection
         """
+        if self.connection is not None:
+            # Idempotent: the database file is opened once per process
+            return
+
+        with self._connect_lock:
+            if self.connection is None:
+                self._connect()
+
+    def _connect(self) -> None:
         if self.dsn:
-            # Ensure parent directory exists
-            Path(self.dsn).parent.mkdir(parents=True, exist_ok=True)
-            self.connection = duckdb.connect(
+            # Ensure parent directory exists (once per process; reconnects after errors skip the syscalls)
+            if (parent := Path(self.dsn).parent) not in _ENSURED_DIRS:
+                parent.mkdir(parents=True, exist_ok=True)
+                _ENSURED_DIRS.add(parent)
+            connection = duckdb.connect(
                 database=self.dsn,
-                read_only=self.read_only
+                read_only=self.read_only,
+                config=self.config,
             )
         else:
             # In-memory database
-            self.connection = duckdb.connect()
+            connection = duckdb.connect(config=self.config)
+
+        # Loaded eagerly, so the first Parquet/JSON/S3 query of a request does not pay the auto-load
+        for extension in self.extensions:
+            self._load_extension(connection, extension)
+        # Published last: the lock-free check in create_connection() never sees a half-set-up connection
+        self.connection = connection
 
         logging.debug(f"DuckDB connection established: {self.dsn or 'in-memory'}")
 
+    @staticmethod
+    def _load_extension(connection: duckdb.DuckDBPyConnection, extension: str) -> None:
+        """ Load only: built-in and already installed extensions need no network.
+            A missing one is installed once; any failure is logged and the extension is left to auto-load
+        """
+        try:
+            connection.load_extension(extension)
+            return
+        except duckdb.Error as e:
+            logging.debug(f"DuckDB extension {extension} is not loadable yet: {e}")
+        try:
+            connection.install_extension(extension)
+            connection.load_extension(extension)
+        except duckdb.Error as e:
+            logging.warning(f"DuckDB extension {extension} is not loaded: {e}")
+
     def handle_exception(self, exc: Exception | None = None) -> None:
         pass
 
+    def get_cursor(self) -> duckdb.DuckDBPyConnection:
+        """ A cursor is a separate connection to the same in-process database:
+            catalog and buffer manager are shared, transaction state is per cursor
+        """
+        if self.connection is None:
+            self.create_connection()
+        return self.connection.cursor()
+
+    def acquire(self) -> duckdb.DuckDBPyConnection:
+        # Concurrent requests (threadpool) must not share one DuckDBPyConnection
+        return self.get_cursor()
+
+    def release(self, connection: duckdb.DuckDBPyConnection, exc: BaseException | None = None) -> None:
+        # Closing the cursor rolls back its unfinished transaction; the database itself stays open
+        connection.close()
+
     def close_connection(self) -> None:
         if self.connection:
             try:
@@ -114,6 +213,8 @@ class DuckDBContextManager(DatabaseConnection):
 
 class PostgreSQLContextManager(DatabaseConnection):
     """Simple context manager for PostgreSQL connections using psycopg2.
+        Every unit of work checks a connection out of a thread-safe pool, so requests do not pay
+        the connect handshake and do not serialize on one socket.
         todo: test the class and set typings
     """
 
@@ -121,74 +222,176 @@ class PostgreSQLContextManager(DatabaseConnection):
             self,
             dsn_string: Optional[str] = None,
             autocommit: bool = False,
+            pool_min_size: int = 1,
+            pool_max_size: int = 25,
+            pool_timeout: float = 30.0,
             **connection_kwargs
     ):
         self.autocommit = autocommit
-        self.connection: Optional[psycopg2.Connection] = None
-        self.connection_params = {"conninfo": dsn_string, **connection_kwargs}
+        self.connection: Optional['PGConnection'] = None
+        self.connection_params = {"dsn": dsn_string, **connection_kwargs}
+        self.pool_size = (pool_min_size, pool_max_size)
+        self.pool: Optional['ThreadedConnectionPool'] = None
+        # ThreadedConnectionPool raises at once when exhausted: callers wait for a free slot up to pool_timeout
+        self.pool_timeout = pool_timeout
+        self._slots = threading.BoundedSemaphore(pool_max_size)
+        self._connect_lock = threading.Lock()
 
     def create_connection(self):
-        self.connection = psycopg2.connect(**self.connection_params)
+        """ Opens the pool (pool_min_size connections); no connection is held outside acquire()/release() """
+        with self._connect_lock:
+            if self.pool is not None:
+                return
+            from psycopg2.pool import ThreadedConnectionPool
 
-        if self.autocommit:
-            self.connection.autocommit = True
+            self.pool = ThreadedConnectionPool(*self.pool_size, **self.connection_params)
 
         logging.debug(f"PostgreSQL connection established: {self.connection_params.get('host', 'DSN')}")
 
+    def test_db_connection(self) -> None:
+        """ psycopg2 connections execute through a cursor """
+        connection = self.acquire()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(PROBE_SQL)
+                result = cursor.fetchone()
+            logging.info("Database is connected")
+        except Exception as e:
+            logging.error(f"Database connection test failed: {e}")
+            raise
+        finally:
+            self.release(connection)
+        if result[0] != 1:
+            raise RuntimeError("Connection test failed")
+
+    def _checkout(self) -> 'PGConnection':
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            raise DatabaseError(f"PostgreSQL pool exhausted: no free connection in {self.pool_timeout}s")
+        try:
+            connection = self.pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        if self.autocommit:
+            connection.autocommit = True
+        return connection
+
+    def acquire(self) -> 'PGConnection':
+        if self.pool is None:
+            self.create_connection()
+        return self._checkout()
+
+    def release(self, connection: 'PGConnection', exc: BaseException | None = None) -> None:
+        broken = False
+        try:
+            if not self.autocommit:
+                if exc:
+                    connection.rollback()
+                    logging.debug("PostgreSQL transaction rolled back due to exception")
+                else:
+                    connection.commit()
+        except Exception:
+            # e.g. the server dropped the connection: it must not go back to the pool
+            broken = True
+            raise
+        finally:
+            # Always returned, or every failed commit/rollback would leak a pool connection and a slot
+            try:
+                self.pool.putconn(connection, close=broken or bool(connection.closed))
+            finally:
+                self._slots.release()
+
     def handle_exception(self, exc: Exception | None = None) -> None:
-        if exc and not self.autocommit:
-            # Rollback transaction on exception
-            self.connection.rollback()
-            logging.debug("PostgreSQL transaction rolled back due to exception")
+        # Transactions are finished per checked out connection in release()
+        pass
 
     def close_connection(self):
-        if not self.autocommit:
-            # Commit transaction on successful completion
-            self.connection.commit()
-            logging.debug("PostgreSQL transaction committed")
-
-        self.connection.close()
-        self.connection = None
+        if self.pool is not None:
+            self.pool.closeall()
+            self.pool = None
+            logging.debug("PostgreSQL pool closed")
 
 
 class DatabaseError(Exception):
     """ Defines a database connection error. Without extra details """
 
 
-@lru_cache(32)
+def run_batch(connection: 'ConnectionType | PGConnection', statements: Iterable[str]) -> None:
+    """ Send several parameterless statements in one round-trip (DuckDB connection or psycopg2 connection) """
+    batch = ";\n".join(statements)
+    if isinstance(connection, duckdb.DuckDBPyConnection):
+        connection.execute(batch)
+    else:
+        with connection.cursor() as cursor:
+            cursor.execute(batch)
+
+
+def wait_db_connection(db_connection: DatabaseConnection, attempts: int | None = None) -> None:
+    """ Opt-in retry of the connection test with short jittered backoff (startup / scripts only) """
+    for attempt in Retrying(
+            stop=stop_after_attempt(attempts or db_connection.probe_attempts),
+            wait=wait_exponential_jitter(initial=0.1, max=2),
+            reraise=True,
+    ):
+        with attempt:
+            db_connection.test_db_connection()
+
+
+_connection: DatabaseConnection | None = None
+_connection_lock = threading.Lock()
+
+
 def create_connection() -> DatabaseConnection:
+    """ Process-wide DatabaseConnection, created on first call (double-checked, thread-safe) """
+    global _connection
+    if _connection is not None:
+        return _connection
+
+    with _connection_lock:
+        if _connection is None:
+            _connection = _build_connection()
+    return _connection
+
+
+def _build_connection() -> DatabaseConnection:
     db_connection = None
     match settings.database.database_type:
         case 'duckdb':
             db_connection = DuckDBContextManager(
-                dsn=settings.database.duck_db_path(),
-                read_only=False
+                dsn=settings.database.duck_db_path,
+                read_only=settings.database.read_only,
+                config=settings.database.duckdb_config,
+                extensions=settings.database.extensions,
             )
         case 'postgresql':
             db_connection = PostgreSQLContextManager(
-                dsn_string=settings.database.postgres_dsn(),
                 autocommit=True,
+                pool_min_size=settings.database.pool_min_size,
+                pool_max_size=settings.database.pool_max_size,
+                pool_timeout=settings.database.pool_timeout,
+                **settings.database.postgresql_parameters,
             )
         case x:
             raise DatabaseError(f'Not supported database type: {x}')
 
-    db_connection.create_connection()
+    # Nothing is opened here: the database file / pool is opened by the first acquire() or warmup
     return db_connection
 
 
 class ConnectionCM:
-    """ A context manager for database Sessions without support for async or connection/session pools.
+    """ A context manager for database Sessions without support for async.
+        The process-wide database is opened once; every enter gets its own cursor (DuckDB)
+        or a pooled connection (PostgreSQL).
         Can be used with any database type and as Depends at FastAPI e.g.
     """
-    _current_connection: DatabaseConnection
+    _current_connection: ClassVar[DatabaseConnection | None] = None
 
     def __new__(cls, db_connection: DatabaseConnection | None = None):
-        if not hasattr(cls, '_current_connection'):
+        if cls._current_connection is None:
             cls._current_connection = db_connection or create_connection()
 
-        instance = super().__new__(cls)
-        instance.__init__(db_connection=db_connection or cls._current_connection)
-        return instance
+        # __init__ is invoked by type.__call__ right after __new__
+        return super().__new__(cls)
 
     def __init__(self, db_connection: DatabaseConnection | None = None):
         self.db_connection = db_connection or self._current_connection
@@ -196,8 +399,8 @@ class ConnectionCM:
     def __enter__(self) -> ConnectionType:
         if not self.db_connection:
             raise DatabaseError("Database connection not initialized")
-        self.db_connection.create_connection()
-        return self.db_connection.connection
+        self.connection = self.db_connection.acquire()
+        return self.connection
 
     def __exit__(
             self,
@@ -205,14 +408,28 @@ class ConnectionCM:
             exc_val: Optional[BaseException],
             exc_tb: Optional[object]
     ):
+        self.db_connection.release(self.connection, exc_val if exc_type else None)
         if exc_type:
-            self.db_connection.handle_exception(exc_val)
-            self.db_connection.close_connection()
             logging.error(f"Database session error: {exc_val}")
-        else:
-            self.db_connection.commit()
 
 
 def opened_connection() -> Generator[DuckDBPyConnection, Any, None]:
     with ConnectionCM() as connection:
         yield connection
+
+
+def duckdb_manager() -> DuckDBContextManager:
+    """ The process-wide database, for code using DuckDB-only APIs (sql/register/fetchdf, PREPARE, ...) """
+    db_connection = create_connection()
+    if not isinstance(db_connection, DuckDBContextManager):
+        raise DatabaseError(
+            f"DuckDB backend is required, the configured one is {settings.database.database_type}"
+        )
+    return db_connection
+
+
+@contextmanager
+def duckdb_cursor() -> Generator[DuckDBPyConnection, Any, None]:
+    """ A cursor of the process-wide DuckDB; fails with DatabaseError on other backends """
+    with ConnectionCM(duckdb_manager()) as cursor:
+        yield cursor
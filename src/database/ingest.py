@@ -0,0 +1,59 @@
+""" Bulk loading into DuckDB: files are read by DuckDB's native readers, frames go through the Appender """
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+from src.database.db_connector import ConnectionType
+
+FILE_READERS = {
+    ".csv": "read_csv_auto",
+    ".parquet": "read_parquet",
+}
+COPY_OPTIONS = {
+    ".csv": "(FORMAT CSV, HEADER)",
+    ".parquet": "(FORMAT PARQUET)",
+}
+
+
+def bulk_load(
+        connection: ConnectionType,
+        table: str,
+        source: Path | str | pd.DataFrame,
+        append: bool = False,
+) -> None:
+    """
+    Load source into the (schema-qualified) table.
+
+    Args:
+        connection: Opened DuckDB connection; the caller owns the transaction
+        table: Target table, e.g. "my_schema.orders"
+        source: DataFrame, or a .csv/.parquet file path (globs like "dir/*.parquet" are allowed)
+        append: Append to the existing table (Appender / COPY) instead of CREATE OR REPLACE
+    """
+    if isinstance(source, pd.DataFrame):
+        if append:
+            connection.append(table, source)
+        else:
+            connection.register("bulk_load_source", source)
+            try:
+                connection.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM bulk_load_source")
+            finally:
+                connection.unregister("bulk_load_source")
+        logging.info(f"{table}: {len(source)} rows loaded from DataFrame")
+        return
+
+    suffix = Path(source).suffix.lower()
+    if suffix not in FILE_READERS:
+        raise ValueError(f"Unsupported bulk load source: {source}")
+
+    if append:
+        path = str(source).replace("'", "''")
+        connection.execute(f"COPY {table} FROM '{path}' {COPY_OPTIONS[suffix]}")
+    else:
+        connection.execute(
+            f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM {FILE_READERS[suffix]}(?)",
+            [str(source)]
+        )
+    logging.info(f"{table}: loaded from {source}")
+
@@ -1,10 +1,8 @@
-import logging
 from datetime import datetime
 from typing import Any
 
 from pydantic import BaseModel
 
-from src.config import settings
 from src.database.base_model import DatabaseObject
 
 
@@ -29,16 +27,10 @@ class NamespaceFullModel(BaseModel):
 class Namespace(DatabaseObject):
     name = "namespace"
     model = NamespaceFullModel
+    dependency_order = 0
 
-    def drop_ddl(self) -> None:
-        self.connection.execute(
-            f""" drop table if exists {self.default_schema}.{self.name} cascade """
-        )
-        self.connection.commit()
-
-    def execute_ddl(self) -> None:
-        ddl_list = []
-        ddl_list.extend([
+    def ddl_statements(self) -> list[str]:
+        return [
             f"""
                 create table if not exists {self.default_schema}.{self.name}
                 (
@@ -50,27 +42,31 @@ class Namespace(DatabaseObject):
                 )
             """,
             f""" CREATE SEQUENCE if not exists {self.autoincrement} START 1 """,
-        ])
-        for ddl in ddl_list:
-            self.connection.execute(ddl)
-            logging.info(f"DDL executed: {ddl}")
-
-        self.connection.commit()
+        ]
 
     def delete(self, id_: int, is_cascade: bool = False) -> None:
         if is_cascade:
             self.connection.execute(
-                f""" delete from {settings.database.default_schema}.namespace_table
+                f""" delete from {self.default_schema}.namespace_table
                     where namespace_id = ?
                 """,
                 (id_,)
             )
-        self.connection.execute(
-            f""" delete from {settings.database.default_schema}.namespace
-                where id = ?
-            """,
-            (id_,)
-        )
+        self.connection.execute(self._statement("delete"), (id_,))
+        self.invalidate_cache()
+        if is_cascade:
+            Table.invalidate_cache()
+
+    def delete_many(self, ids: list[int], is_cascade: bool = False) -> None:
+        if is_cascade and ids:
+            self.connection.execute(
+                f""" delete from {self.default_schema}.namespace_table
+                    where namespace_id in (select unnest(?))
+                """,
+                (list(ids),)
+            )
+            Table.invalidate_cache()
+        super().delete_many(ids)
 
 
 class TablePartModel(BaseModel):
@@ -79,6 +75,13 @@ class TablePartModel(BaseModel):
     table_name: str
 
 
+class TableLoadedModel(TablePartModel):
+    """ A table registered together with its already loaded file """
+    file_name: str | None = None
+    file_size: int | None = None
+    is_loaded: bool = True
+
+
 class TableFullModel(BaseModel):
     id: int
     namespace_id: int
@@ -94,16 +97,10 @@ class TableFullModel(BaseModel):
 class Table(DatabaseObject):
     name: str = "namespace_table"
     model = TableFullModel
+    dependency_order = 1  # FK -> namespace
 
-    def drop_ddl(self) -> None:
-        self.connection.execute(
-            f""" drop table if exists {self.default_schema}.{self.name} cascade """
-        )
-        self.connection.commit()
-
-    def execute_ddl(self) -> None:
-        ddl_list = []
-        ddl_list.extend([
+    def ddl_statements(self) -> list[str]:
+        return [
             f"""
                 create table if not exists {self.default_schema}.{self.name}
                 (
@@ -121,9 +118,4 @@ class Table(DatabaseObject):
                 )
             """,
             f""" CREATE SEQUENCE if not exists {self.autoincrement} START 1 """,
-        ])
-        for ddl in ddl_list:
-            logging.info(f"DDL executing: {ddl}")
-            self.connection.execute(ddl)
-
-        self.connection.commit()
+        ]
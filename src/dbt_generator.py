@@ -48,6 +48,20 @@ Hints:
 - Keep it compact and production-like.
 """
 
+# Pre-split around the schema slot: only the short hints tail is formatted per request
+_DBT_PROMPT_HEAD, _DBT_PROMPT_TAIL = SYSTEM_PROMPT_DBT.split("{schema_docs}")
+_DBT_PROMPT_HEAD = _DBT_PROMPT_HEAD.format()  # unescape config{{}}
+
+
+# Compiled once at import
+_BLOCK_RE = {
+    lang: re.compile(rf"```{lang}\s*(.*?)```", re.IGNORECASE | re.DOTALL)
+    for lang in ("sql", "yaml")
+}
+_NON_WORD_RE = re.compile(r"[^a-z0-9_]+")
+_REPEATED_UNDERSCORE_RE = re.compile(r"_+")
+_YAML_MODEL_NAME_RE = re.compile(r"(models:\s*-\s*name:\s*)([a-zA-Z0-9_\-]+)")
+
 
 def _extract_block(text: str, lang: str) -> Optional[str]:
     """
@@ -56,7 +70,8 @@ def _extract_block(text: str, lang: str) -> Optional[str]:
     ...
     ```
     """
-    m = re.search(rf"```{lang}\s*(.*?)```", text, re.IGNORECASE | re.DOTALL)
+    pattern = _BLOCK_RE.get(lang) or re.compile(rf"```{lang}\s*(.*?)```", re.IGNORECASE | re.DOTALL)
+    m = pattern.search(text)
     if not m:
         return None
     return m.group(1).strip()
@@ -65,9 +80,9 @@ def _extract_block(text: str, lang: str) -> Optional[str]:
 def _sanitize_model_name(name: str) -> str:
     name = name.strip().lower()
     # replace non-word chars with underscore
-    name = re.sub(r"[^a-z0-9_]+", "_", name)
+    name = _NON_WORD_RE.sub("_", name)
     # collapse repeats, trim edges
-    name = re.sub(r"_+", "_", name).strip("_")
+    name = _REPEATED_UNDERSCORE_RE.sub("_", name).strip("_")
     if not name:
         name = "generated_model"
     return name
@@ -85,8 +100,7 @@ async def generate_dbt_model(
     qn = normalize_question(question)
     schema_docs = load_schema_docs()
     suggested_name = _sanitize_model_name(model_name or f"mart_{qn[:32]}")
-    system = SYSTEM_PROMPT_DBT.format(
-        schema_docs=schema_docs,
+    system = _DBT_PROMPT_HEAD + schema_docs + _DBT_PROMPT_TAIL.format(
         question=qn,
         model_name=suggested_name,
     )
@@ -101,9 +115,8 @@ async def generate_dbt_model(
 
     # Optional: inject final model name into yaml if missing
     if f"name: {suggested_name}" not in yaml_block:
-        yaml_block = re.sub(
-            r"(models:\s*-\s*name:\s*)([a-zA-Z0-9_\-]+)",
-            rf"\1{suggested_name}",
+        yaml_block = _YAML_MODEL_NAME_RE.sub(
+            rf"\g<1>{suggested_name}",
             yaml_block,
             count=1,
         )
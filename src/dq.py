@@ -1,30 +1,25 @@
+import itertools
 import math
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import Optional, Any, Dict, List, Tuple
 
-import duckdb
 import pandas as pd
 
 from src.config import settings
+from src.database.db_connector import duckdb_cursor, duckdb_manager
 
 
 # ---- Fetch helpers ----
-def _connect():
-    con = duckdb.connect(settings.data.data_dir / settings.database.file_name)
-    con.execute("SET threads TO 2; SET memory_limit='512MB';")
-    return con
-
-
 def fetch_table_sample(table: str, where: Optional[str] = None, limit: Optional[int] = None) -> pd.DataFrame:
     n = limit or settings.data_quality.default_limit
     n = min(max(n, 1), settings.data_quality.max_limit)
     where_sql = f" WHERE {where} " if where and where.strip() else " "
     sql = f"SELECT * FROM {table}{where_sql}LIMIT {n}"
-    con = _connect()
-    try:
+    # A cursor of the process-wide database: no file open and no SET threads/memory_limit per call
+    with duckdb_cursor() as con:
         df = con.execute(sql).fetchdf()
-    finally:
-        con.close()
     return df
 
 
@@ -36,45 +31,90 @@ def _safe_len(x) -> Optional[int]:
         return None
 
 
+def _text_lengths(non_null: pd.Series) -> pd.Series:
+    try:
+        # Vectorized: strings and lists get their len, other values NaN
+        return non_null.str.len().dropna()
+    except AttributeError:
+        # .str refuses object columns without any text (ints, bools, ...): per-value fallback
+        return non_null.map(_safe_len).dropna()
+
+
+def _quote(col: Any) -> str:
+    """ Column name as a DuckDB identifier """
+    return '"' + str(col).replace('"', '""') + '"'
+
+
+def _opt_float(x) -> Optional[float]:
+    return float(x) if x is not None else None
+
+
+def _profile_aggregates(df: pd.DataFrame, max_top: int) -> Tuple[Dict[Any, Dict[str, Any]], Dict[Any, List[tuple]]]:
+    """ Counts, distinct and numeric/datetime stats of every column: one DuckDB scan of the sample
+        plus the max_top most frequent values per column (GROUP BY + LIMIT: a top-N heap, not a full sort)
+    """
+    kinds: Dict[Any, str] = {}
+    exprs: List[str] = ["count(*)"]
+    for col in df.columns:
+        q = _quote(col)
+        exprs += [f"count({q})", f"count(DISTINCT {q})"]
+        if pd.api.types.is_numeric_dtype(df[col]):
+            kinds[col] = "numeric"
+            v = f"{q}::DOUBLE"
+            exprs += [f"min({v})", f"max({v})", f"avg({v})", f"stddev_pop({v})",
+                      f"quantile_cont({v}, 0.5)", f"quantile_cont({v}, 0.95)"]
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            kinds[col] = "datetime"
+            exprs += [f"min({q})", f"max({q})"]
+        else:
+            kinds[col] = "text"
+
+    with duckdb_cursor() as con:
+        con.register("profile_sample", df)
+        row = iter(con.execute(f"SELECT {', '.join(exprs)} FROM profile_sample").fetchone())
+        top = {
+            col: con.execute(
+                f"SELECT {_quote(col)}, count(*) AS c FROM profile_sample WHERE {_quote(col)} IS NOT NULL "
+                f"GROUP BY 1 ORDER BY c DESC, 1 LIMIT {int(max_top)}"
+            ).fetchall()
+            for col in df.columns
+        }
+
+    total = int(next(row))
+    stats: Dict[Any, Dict[str, Any]] = {}
+    for col in df.columns:
+        non_null, distinct = int(next(row)), int(next(row))
+        info: Dict[str, Any] = {"count": total, "nulls": total - non_null, "distinct": distinct}
+        if kinds[col] == "numeric":
+            for key in ("min", "max", "mean", "std", "p50", "p95"):
+                info[key] = _opt_float(next(row))
+        elif kinds[col] == "datetime":
+            for key in ("min_ts", "max_ts"):
+                ts = next(row)
+                info[key] = ts.isoformat() if ts is not None else None
+        stats[col] = info
+    return stats, top
+
+
 def profile_df(df: pd.DataFrame, max_top: int = 5) -> Dict[str, Dict[str, Any]]:
     prof: Dict[str, Dict[str, Any]] = {}
+    aggregates, top = _profile_aggregates(df, max_top)
     for col in df.columns:
         s = df[col]
         non_null = s.dropna()
-        dtype = str(s.dtype)
-        info: Dict[str, Any] = {
-            "dtype": dtype,
-            "count": int(s.shape[0]),
-            "nulls": int(s.isna().sum()),
-            "distinct": int(non_null.nunique()),
-        }
-        if pd.api.types.is_numeric_dtype(s):
-            info.update({
-                "min": float(non_null.min()) if not non_null.empty else None,
-                "max": float(non_null.max()) if not non_null.empty else None,
-                "mean": float(non_null.mean()) if not non_null.empty else None,
-                "std": float(non_null.std(ddof=0)) if not non_null.empty else None,
-                "p50": float(non_null.quantile(0.5)) if not non_null.empty else None,
-                "p95": float(non_null.quantile(0.95)) if not non_null.empty else None,
-            })
-        elif pd.api.types.is_datetime64_any_dtype(s):
-            info.update({
-                "min_ts": non_null.min().isoformat() if not non_null.empty else None,
-                "max_ts": non_null.max().isoformat() if not non_null.empty else None,
-            })
-        else:
+        info: Dict[str, Any] = {"dtype": str(s.dtype), **aggregates[col]}
+        if not (pd.api.types.is_numeric_dtype(s) or pd.api.types.is_datetime64_any_dtype(s)):
             # text-like: длины
-            lens = non_null.map(_safe_len).dropna()
+            lens = _text_lengths(non_null)
             if not lens.empty:
                 info.update({
                     "min_len": int(lens.min()),
                     "max_len": int(lens.max()),
                     "p95_len": float(pd.Series(lens).quantile(0.95)),
                 })
-        # top values
-        vc = non_null.value_counts().head(max_top)
+        # top values (ties by value)
         info["top_values"] = [{"value": (k.isoformat() if hasattr(k, "isoformat") else k), "count": int(v)} for k, v in
-                              vc.items()]
+                              top[col]]
         prof[col] = info
     return prof
 
@@ -91,84 +131,170 @@ def _pct(x: int, total: int) -> float:
     return round(100.0 * x / total, 4) if total else 0.0
 
 
-def check_not_null(df: pd.DataFrame, col: str) -> RuleResult:
-    nulls = int(df[col].isna().sum())
-    total = int(df.shape[0])
-    return RuleResult({"type": "not_null", "column": col}, nulls == 0,
-                      {"nulls": nulls, "total": total, "null_rate_pct": _pct(nulls, total)})
-
-
-def check_unique(df: pd.DataFrame, col: str) -> RuleResult:
-    s = df[col]
-    total = int(s.shape[0])
-    d = int(s.dropna().nunique())
-    dupes = total - d
-    return RuleResult({"type": "unique", "column": col}, dupes == 0,
-                      {"distinct": d, "total": total, "duplicates": dupes, "dupe_rate_pct": _pct(dupes, total)})
-
-
-def check_range(df: pd.DataFrame, col: str, min_val: Optional[float], max_val: Optional[float]) -> RuleResult:
-    s = df[col].dropna()
-    below = int((s < min_val).sum()) if min_val is not None else 0
-    above = int((s > max_val).sum()) if max_val is not None else 0
-    violations = below + above
-    total = int(df.shape[0])
-    return RuleResult({"type": "range", "column": col, "min": min_val, "max": max_val}, violations == 0, {
-        "violations": violations, "below_min": below, "above_max": above, "total": total,
-        "viol_rate_pct": _pct(violations, total)
-    })
-
-
-def check_freshness(df: pd.DataFrame, ts_col: str, max_age_hours: int) -> RuleResult:
-    s = pd.to_datetime(df[ts_col], errors="coerce").dropna()
-    if s.empty:
-        return RuleResult({"type": "freshness", "column": ts_col, "max_age_hours": max_age_hours}, False,
-                          {"error": "no timestamps"})
-    latest = s.max()
-    now = pd.Timestamp.utcnow()
-    age_hours = float((now - latest).total_seconds() / 3600.0)
-    return RuleResult({"type": "freshness", "column": ts_col, "max_age_hours": max_age_hours},
-                      age_hours <= max_age_hours, {
-                          "latest_iso": latest.isoformat(), "age_hours": round(age_hours, 3)
-                      })
-
-
-def check_anomaly_zscore(df: pd.DataFrame, col: str, sigma: float = settings.data_quality.default_sigma) -> RuleResult:
-    s = pd.to_numeric(df[col], errors="coerce").dropna()
-    total = int(df.shape[0])
-    if s.empty or s.std(ddof=0) == 0 or math.isnan(s.std(ddof=0)):
-        return RuleResult({"type": "anomaly", "column": col, "method": "zscore", "sigma": sigma}, True,
-                          {"skipped": "no variance or no data", "total": total})
-    m = float(s.mean());
-    st = float(s.std(ddof=0))
-    z = (s - m).abs() / st
-    outliers = int((z > sigma).sum())
-    return RuleResult({"type": "anomaly", "column": col, "method": "zscore", "sigma": sigma}, outliers == 0, {
-        "mean": round(m, 6), "std": round(st, 6), "sigma": sigma, "outliers": outliers, "total": total,
-        "outlier_pct": _pct(outliers, total)
-    })
+# ---- Pushdown rules: the same checks as one DuckDB query over the whole (filtered) table ----
+def _rule_param(r: Dict[str, Any], key: str, default: Any) -> Any:
+    """ Rules from the API carry every key, unset ones as None """
+    value = r.get(key)
+    return default if value is None else value
 
 
-# ---- Orchestrator ----
-def run_checks(table: str, where: Optional[str], rules: List[Dict[str, Any]], sample_limit: Optional[int] = None) -> \
-Tuple[Dict[str, Any], List[RuleResult], pd.DataFrame]:
-    df = fetch_table_sample(table, where=where, limit=sample_limit)
-    prof = profile_df(df)
+def _rules_query(table: str, where: Optional[str], rules: List[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+    """ All rules as aggregates of one SELECT: the table is scanned once (twice with anomaly rules) """
+    where_sql = f" WHERE {where} " if where and where.strip() else " "
+    exprs: List[str] = ["count(*)"]
+    stats: List[str] = []
+    params: List[Any] = []
+    for i, r in enumerate(rules):
+        rtype = r.get("type")
+        q = _quote(r.get("column"))
+        if rtype == "not_null":
+            exprs.append(f"count(*) - count({q})")
+        elif rtype == "unique":
+            exprs.append(f"count(DISTINCT {q})")
+        elif rtype == "range":
+            for op, bound in (("<", r.get("min")), (">", r.get("max"))):
+                if bound is None:
+                    exprs.append("0")
+                else:
+                    # Numeric comparison on any column type (text too): non-numeric values are not counted
+                    exprs.append(f"count(*) FILTER (WHERE try_cast({q} AS DOUBLE) {op} ?)")
+                    params.append(float(bound))
+        elif rtype == "freshness":
+            # Absolute instants, returned as naive UTC: a TIMESTAMPTZ column cast to TIMESTAMP would give
+            # the session time zone's wall clock; naive values are read as UTC (the DQ cursor runs in UTC)
+            exprs.append(f"max(timezone('UTC', try_cast({q} AS TIMESTAMPTZ)))")
+        elif rtype == "anomaly":
+            v = f"try_cast({q} AS DOUBLE)"
+            stats += [f"avg({v}) AS m{i}", f"stddev_pop({v}) AS s{i}", f"count({v}) AS n{i}"]
+            exprs += [f"any_value(m{i})", f"any_value(s{i})", f"any_value(n{i})",
+                      f"count(*) FILTER (WHERE abs({v} - m{i}) / s{i} > ?)"]
+            params.append(float(_rule_param(r, "sigma", settings.data_quality.default_sigma)))
+
+    source = f"SELECT * FROM {table}{where_sql}"
+    if stats:
+        sql = (f"WITH src AS ({source}), stats AS (SELECT {', '.join(stats)} FROM src) "
+               f"SELECT {', '.join(exprs)} FROM src, stats")
+    else:
+        sql = f"SELECT {', '.join(exprs)} FROM ({source}) src"
+    return sql, params
+
+
+def _age_hours(latest) -> float:
+    """ latest: the naive UTC timestamp of the freshness rule """
+    latest = pd.Timestamp(latest)
+    if latest.tzinfo is None:
+        latest = latest.tz_localize("UTC")
+    return float((pd.Timestamp.now(tz="UTC") - latest).total_seconds() / 3600.0)
+
+
+# Rule queries prepared once per worker thread and query shape; the constants (bounds, sigma) vary per call
+_MAX_PREPARED = 64
+_prepared = threading.local()
+# Every per-thread cursor, so shutdown can close them; a closed generation makes threads open a new cursor
+_prepared_cursors: List[Any] = []
+_prepared_lock = threading.Lock()
+_prepared_generation = 0
+
+
+def close_prepared_cursors() -> None:
+    """ Called on application shutdown: closes the DQ cursors (their prepared statements go with them) """
+    global _prepared_generation
+    with _prepared_lock:
+        _prepared_generation += 1
+        for cursor in _prepared_cursors:
+            cursor.close()
+        _prepared_cursors.clear()
+
+
+def _execute_prepared(sql: str, params: List[float]) -> tuple:
+    """ PREPARE on first use, then EXECUTE: repeated checks of a table skip DuckDB's parse/bind/plan
+        The statements live on a long-lived DuckDB cursor of this thread (a per-call cursor would drop them);
+        DuckDB only: a cursor is a cheap handle on the shared database, not a pooled connection
+    """
+    state = getattr(_prepared, "state", None)
+    if state is None or state[0] != _prepared_generation:
+        with _prepared_lock:
+            cursor = duckdb_manager().get_cursor()
+            # Session setting of this cursor only: naive timestamps of the freshness rule are taken as UTC
+            cursor.execute("SET TimeZone = 'UTC'")
+            _prepared_cursors.append(cursor)
+            state = _prepared.state = (_prepared_generation, cursor, OrderedDict(), itertools.count())
+    _, con, names, counter = state
+
+    if (name := names.get(sql)) is None:
+        name = f"dq_rules_{next(counter)}"
+        con.execute(f"PREPARE {name} AS {sql}")
+        names[sql] = name
+        if len(names) > _MAX_PREPARED:
+            con.execute(f"DEALLOCATE {names.popitem(last=False)[1]}")
+    else:
+        names.move_to_end(sql)
+
+    # params are floats built by _rules_query: the literals are safe to inline
+    args = ", ".join(f"'{p!r}'::DOUBLE" for p in params)
+    return con.execute(f"EXECUTE {name}({args})" if params else f"EXECUTE {name}").fetchone()
+
+
+def run_rules_sql(table: str, where: Optional[str], rules: List[Dict[str, Any]]) -> List[RuleResult]:
+    sql, params = _rules_query(table, where, rules)
+    row = iter(_execute_prepared(sql, params))
+
+    total = int(next(row))
     results: List[RuleResult] = []
     for r in rules:
         rtype = r.get("type")
+        col = r.get("column")
         if rtype == "not_null":
-            results.append(check_not_null(df, r["column"]))
+            nulls = int(next(row))
+            results.append(RuleResult({"type": "not_null", "column": col}, nulls == 0,
+                                      {"nulls": nulls, "total": total, "null_rate_pct": _pct(nulls, total)}))
         elif rtype == "unique":
-            results.append(check_unique(df, r["column"]))
+            d = int(next(row))
+            dupes = total - d
+            results.append(RuleResult({"type": "unique", "column": col}, dupes == 0, {
+                "distinct": d, "total": total, "duplicates": dupes, "dupe_rate_pct": _pct(dupes, total)
+            }))
         elif rtype == "range":
-            results.append(check_range(df, r["column"], r.get("min"), r.get("max")))
+            below, above = int(next(row)), int(next(row))
+            violations = below + above
+            results.append(RuleResult(
+                {"type": "range", "column": col, "min": r.get("min"), "max": r.get("max")}, violations == 0, {
+                    "violations": violations, "below_min": below, "above_max": above, "total": total,
+                    "viol_rate_pct": _pct(violations, total)
+                }))
         elif rtype == "freshness":
-            results.append(check_freshness(df, r["column"], int(r.get("max_age_hours", 24))))
+            max_age_hours = int(_rule_param(r, "max_age_hours", 24))
+            rule = {"type": "freshness", "column": col, "max_age_hours": max_age_hours}
+            if (latest := next(row)) is None:
+                results.append(RuleResult(rule, False, {"error": "no timestamps"}))
+            else:
+                age_hours = _age_hours(latest)
+                results.append(RuleResult(rule, age_hours <= max_age_hours, {
+                    "latest_iso": pd.Timestamp(latest).isoformat(), "age_hours": round(age_hours, 3)
+                }))
         elif rtype == "anomaly":
-            results.append(check_anomaly_zscore(df, r["column"], float(r.get("sigma", settings.data_quality.default_sigma))))
+            sigma = float(_rule_param(r, "sigma", settings.data_quality.default_sigma))
+            rule = {"type": "anomaly", "column": col, "method": "zscore", "sigma": sigma}
+            m, st, n, outliers = next(row), next(row), next(row), int(next(row))
+            if not n or not st or math.isnan(st):
+                results.append(RuleResult(rule, True, {"skipped": "no variance or no data", "total": total}))
+            else:
+                results.append(RuleResult(rule, outliers == 0, {
+                    "mean": round(m, 6), "std": round(st, 6), "sigma": sigma, "outliers": outliers,
+                    "total": total, "outlier_pct": _pct(outliers, total)
+                }))
         else:
             results.append(RuleResult({"type": rtype}, False, {"error": "unknown rule"}))
+    return results
+
+
+# ---- Orchestrator ----
+def run_checks(table: str, where: Optional[str], rules: List[Dict[str, Any]], sample_limit: Optional[int] = None) -> \
+Tuple[Dict[str, Any], List[RuleResult], pd.DataFrame]:
+    """ The rules run in DuckDB over the whole filtered table; the sample is fetched for the profile/preview only """
+    df = fetch_table_sample(table, where=where, limit=sample_limit)
+    prof = profile_df(df)
+    results = run_rules_sql(table, where, rules)
     return prof, results, df.head(min(50, len(df)))
 
 
@@ -1,4 +1,3 @@
-import base64
 
 import httpx
 
@@ -9,6 +8,29 @@ class GitHubError(RuntimeError):
     pass
 
 
+# One keep-alive client for all calls: a PR flow re-uses the TLS connection instead of a handshake per request
+_CLIENT: httpx.AsyncClient | None = None
+
+
+def _client() -> httpx.AsyncClient:
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        _CLIENT = httpx.AsyncClient(
+            base_url="https://api.github.com",
+            timeout=30,
+            limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+        )
+    return _CLIENT
+
+
+async def close_client() -> None:
+    """ Called on application shutdown """
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
+
+
 def _headers():
     if not settings.git.github_token:
         raise GitHubError("GITHUB_TOKEN is not set")
@@ -21,65 +43,74 @@ def _headers():
 def _api(path: str) -> str:
     if not settings.git.github_repo:
         raise GitHubError("GITHUB_REPO is not set (expected 'owner/repo')")
-    return f"https://api.github.com/repos/{settings.git.github_repo}{path}"
+    return f"/repos/{settings.git.github_repo}{path}"
 
 
 async def get_branch_sha(branch: str) -> str:
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.get(_api(f"/git/ref/heads/{branch}"), headers=_headers())
-        if r.status_code == 404:
-            raise GitHubError(f"Branch not found: {branch}")
-        r.raise_for_status()
-        return r.json()["object"]["sha"]
+    r = await _client().get(_api(f"/git/ref/heads/{branch}"), headers=_headers())
+    if r.status_code == 404:
+        raise GitHubError(f"Branch not found: {branch}")
+    r.raise_for_status()
+    return r.json()["object"]["sha"]
 
 
 async def create_branch(new_branch: str, from_branch: str | None = None) -> str:
     base = from_branch or settings.git.default_branch
     sha = await get_branch_sha(base)
     payload = {"ref": f"refs/heads/{new_branch}", "sha": sha}
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.post(_api("/git/refs"), headers=_headers(), json=payload)
-        if r.status_code not in (200, 201, 422):  # 422 if already exists
-            raise GitHubError(f"Create branch failed: {r.status_code} {r.text}")
-        if r.status_code == 422:
-            # already exists → just return sha
-            return await get_branch_sha(new_branch)
-        return r.json()["object"]["sha"]
-
-
-async def get_file_sha_if_exists(path: str, branch: str) -> str | None:
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.get(_api(f"/contents/{path}"), headers=_headers(), params={"ref": branch})
-        if r.status_code == 404:
-            return None
-        r.raise_for_status()
-        return r.json().get("sha")
-
-
-async def upsert_file(path: str, content: str, branch: str, message: str) -> dict:
-    b64 = base64.b64encode(content.encode("utf-8")).decode("ascii")
-    sha = await get_file_sha_if_exists(path, branch)
+    r = await _client().post(_api("/git/refs"), headers=_headers(), json=payload)
+    if r.status_code not in (200, 201, 422):  # 422 if already exists
+        raise GitHubError(f"Create branch failed: {r.status_code} {r.text}")
+    if r.status_code == 422:
+        # already exists → just return sha
+        return await get_branch_sha(new_branch)
+    return r.json()["object"]["sha"]
+
+
+async def commit_files(files: dict[str, str], branch: str, message: str) -> str:
+    """ All files in one commit through the Git Data API; returns the new commit sha
+        Four requests for any number of files: head commit -> tree (contents inline) -> commit -> ref update.
+        The ref update is not forced: a branch moved in the meantime fails instead of losing a commit
+    """
+    if not files:
+        raise GitHubError("No files to commit")
+    r = await _client().get(_api(f"/commits/{branch}"), headers=_headers())
+    if r.status_code in (404, 422):
+        raise GitHubError(f"Branch not found: {branch}")
+    r.raise_for_status()
+    head = r.json()
+
+    tree = [{"path": path, "mode": "100644", "type": "blob", "content": content} for path, content in files.items()]
+    r = await _client().post(
+        _api("/git/trees"), headers=_headers(), json={"base_tree": head["commit"]["tree"]["sha"], "tree": tree}
+    )
+    if r.status_code != 201:
+        raise GitHubError(f"Create tree failed: {r.status_code} {r.text}")
+
+    committer = {"name": settings.git.author_name, "email": settings.git.author_email}
     payload = {
         "message": message,
-        "content": b64,
-        "branch": branch,
-        "committer": {"name": settings.git.author_name, "email": settings.git.author_email},
+        "tree": r.json()["sha"],
+        "parents": [head["sha"]],
+        "author": committer,
+        "committer": committer,
     }
-    if sha:
-        payload["sha"] = sha
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.put(_api(f"/contents/{path}"), headers=_headers(), json=payload)
-        if r.status_code not in (200, 201):
-            raise GitHubError(f"Upsert file failed: {r.status_code} {r.text}")
-        return r.json()
+    r = await _client().post(_api("/git/commits"), headers=_headers(), json=payload)
+    if r.status_code != 201:
+        raise GitHubError(f"Create commit failed: {r.status_code} {r.text}")
+    commit_sha = r.json()["sha"]
+
+    r = await _client().patch(_api(f"/git/refs/heads/{branch}"), headers=_headers(), json={"sha": commit_sha})
+    if r.status_code != 200:
+        raise GitHubError(f"Update branch failed: {r.status_code} {r.text}")
+    return commit_sha
 
 
 async def create_pull_request(title: str, head: str, base: str | None = None, body: str | None = None) -> dict:
     payload = {"title": title, "head": head, "base": base or settings.git.default_branch}
     if body:
         payload["body"] = body
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.post(_api("/pulls"), headers=_headers(), json=payload)
-        if r.status_code not in (200, 201):
-            raise GitHubError(f"Create PR failed: {r.status_code} {r.text}")
-        return r.json()
+    r = await _client().post(_api("/pulls"), headers=_headers(), json=payload)
+    if r.status_code not in (200, 201):
+        raise GitHubError(f"Create PR failed: {r.status_code} {r.text}")
+    return r.json()
@@ -1,14 +1,28 @@
-import shutil
+import os
 import tempfile
 from pathlib import Path
 
 
-def atomic_write_text(target: Path, content: str, encoding: str = "utf-8"):
-    target.parent.mkdir(parents=True, exist_ok=True)
-    with tempfile.NamedTemporaryFile("w", delete=False, encoding=encoding) as tmp:
-        tmp.write(content)
-        tmp_path = tmp.name
-    shutil.move(tmp_path, target)
+def atomic_write_text(target: Path, content: str, encoding: str = "utf-8") -> bool:
+    """ Write through a temp file in the target directory and os.replace it (an atomic rename, never a copy)
+        Returns False when the file already has this content and nothing was written
+    """
+    data = content.encode(encoding)
+    try:
+        if target.stat().st_size == len(data) and target.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=".tmp_", suffix=target.suffix)
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, target)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return True
 
 
 def write_files_atomic(root: Path, files: dict[str, str]) -> dict[str, str]:
@@ -1,21 +1,34 @@
+import asyncio
 from contextlib import asynccontextmanager
 from typing import AsyncIterator
 
 from fastapi import FastAPI
 
-from src.database.db_connector import create_connection, ConnectionCM
+from src.config import settings
+from src.database.db_connector import create_connection, ConnectionCM, wait_db_connection, DatabaseConnection
 from src.database import create_all
+from src.dq import close_prepared_cursors
+from src.github_client import close_client
+
+
+def _prepare_database(db_connection: DatabaseConnection) -> None:
+    wait_db_connection(db_connection)
+    # Up to date schema: one SELECT of the stored schema version, the DDL runs only when it changed
+    create_all(ConnectionCM(db_connection))
 
 
 @asynccontextmanager
 async def lifespan_routine(app: FastAPI) -> AsyncIterator[None]:
     """put any other startup init here (DB pools, caches, etc.)"""
+    settings.validate_required_settings()
     db_connection = create_connection()
-    db_connection.test_db_connection()
+    # Awaited: requests must not run before the metadata tables exist; in a thread, the loop is not blocked
+    await asyncio.to_thread(_prepare_database, db_connection)
 
     try:
         yield
     finally:
         # --- shutdown ---
-        ...
+        await close_client()
+        close_prepared_cursors()
         # close other resources here
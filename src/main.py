@@ -1,6 +1,7 @@
 import logging
 
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 from prometheus_client import generate_latest
 from prometheus_fastapi_instrumentator import Instrumentator
 from starlette.responses import Response
@@ -23,15 +24,17 @@ app = FastAPI(
     debug=True,
     lifespan=lifespan_routine
 )
+# SQL previews / DQ profiles are multi-KB JSON; small payloads are sent as is
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 
 @app.get("/health")
-def health_route() -> dict:
+async def health_route() -> dict:
     return {"status": "ok"}
 
 
 @app.get("/description")
-def description_route() -> dict:
+async def description_route() -> dict:
     return {"message": "Here will be a description of database"}
 
 
@@ -56,4 +59,5 @@ app.include_router(chat_router)
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("main:app", host=settings.server.host, port=settings.server.port, reload=True)
+    # Single process on purpose (one DuckDB writer); keep-alive above the default 5s avoids reconnects behind proxies
+    uvicorn.run("main:app", host=settings.server.host, port=settings.server.port, workers=1, timeout_keep_alive=75)
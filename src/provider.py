@@ -1,3 +1,9 @@
+import asyncio
+import functools
+import json
+import time
+from collections import OrderedDict
+
 import httpx
 
 from src.config import settings
@@ -10,10 +16,39 @@ GEN_PARAMS = {
 }
 
 
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
 class LLMError(RuntimeError):
     pass
 
 
+type CompletionKey = tuple[str, str, str, str]
+
+# Completions currently awaited upstream, keyed by (provider, model, system, user)
+_inflight: dict[CompletionKey, asyncio.Future[str]] = {}
+
+# LRU of finished completions: generation is near-deterministic (low temperature), so a repeated
+# question with the same system prompt gets the same answer without another round-trip.
+# Entries expire after RESPONSE_TTL_S, so a bad answer is not served until restart
+RESPONSE_CACHE_SIZE = 512
+RESPONSE_TTL_S = 600.0
+_responses: OrderedDict[CompletionKey, tuple[str, float]] = OrderedDict()
+
+
+@functools.lru_cache(maxsize=16)
+def _system_message_json(system_prompt: str) -> str:
+    """ The system prompt (schema docs included) is the same for every request: encode it once """
+    return json.dumps({"role": "system", "content": system_prompt})
+
+
+def chat_payload(system_prompt: str, user_prompt: str, **extra) -> bytes:
+    """ OpenAI-compatible chat/completions body; only the user turn and params are encoded per request """
+    messages = _system_message_json(system_prompt) + "," + json.dumps({"role": "user", "content": user_prompt})
+    params = json.dumps({"model": settings.llm.model, **GEN_PARAMS, **extra})
+    return ('{"messages":[' + messages + "]," + params[1:]).encode("utf-8")
+
+
 async def openai_complete(system_prompt: str, user_prompt: str) -> str:
     if not settings.llm.openai_api_key:
         raise LLMError("OPENAI_API_KEY is not set")
@@ -23,18 +58,9 @@ async def openai_complete(system_prompt: str, user_prompt: str) -> str:
         "Authorization": f"Bearer {settings.llm.openai_api_key}",
         "Content-Type": "application/json",
     }
-    payload = {
-        "model": settings.llm.model,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        "temperature": GEN_PARAMS["temperature"],
-        "top_p": GEN_PARAMS["top_p"],
-        "max_tokens": GEN_PARAMS["max_tokens"],
-    }
+    payload = chat_payload(system_prompt, user_prompt)
     async with httpx.AsyncClient(timeout=30.0) as client:
-        r = await client.post(url, headers=headers, json=payload)
+        r = await client.post(url, headers=headers, content=payload)
         if r.status_code >= 300:
             raise LLMError(f"OpenAI error {r.status_code}: {r.text}")
         data = r.json()
@@ -52,18 +78,9 @@ async def openrouter_complete(system_prompt: str, user_prompt: str) -> str:
         "X-Title": "Data Platform Copilot",
         "Content-Type": "application/json",
     }
-    payload = {
-        "model": settings.llm.model,  # e.g. "meta-llama/llama-3.1-70b-instruct:free"
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        "temperature": GEN_PARAMS["temperature"],
-        "top_p": GEN_PARAMS["top_p"],
-        "max_tokens": GEN_PARAMS["max_tokens"],
-    }
+    payload = chat_payload(system_prompt, user_prompt)  # model e.g. "meta-llama/llama-3.1-70b-instruct:free"
     async with httpx.AsyncClient(timeout=45.0) as client:
-        r = await client.post(url, headers=headers, json=payload)
+        r = await client.post(url, headers=headers, content=payload)
         if r.status_code >= 300:
             raise LLMError(f"OpenRouter error {r.status_code}: {r.text}")
         data = r.json()
@@ -72,19 +89,9 @@ async def openrouter_complete(system_prompt: str, user_prompt: str) -> str:
 
 async def ollama_complete(system_prompt: str, user_prompt: str) -> str:
     url = f"{settings.llm.ollama_base_url}/v1/chat/completions"  # Ollama's compatible endpoint >= v0.3
-    payload = {
-        "model": settings.llm.model,  # e.g. "llama3.1"
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        "temperature": GEN_PARAMS["temperature"],
-        "top_p": GEN_PARAMS["top_p"],
-        "max_tokens": GEN_PARAMS["max_tokens"],
-        "stream": False,
-    }
+    payload = chat_payload(system_prompt, user_prompt, stream=False)  # model e.g. "llama3.1"
     async with httpx.AsyncClient(timeout=60.0) as client:
-        r = await client.post(url, json=payload)
+        r = await client.post(url, headers=JSON_HEADERS, content=payload)
         if r.status_code >= 300:
             raise LLMError(f"Ollama error {r.status_code}: {r.text}")
         data = r.json()
@@ -100,11 +107,73 @@ async def ollama_complete(system_prompt: str, user_prompt: str) -> str:
             raise LLMError(f"Ollama unexpected response: {data}")
 
 
-async def complete(system_prompt: str, user_prompt: str) -> str:
+async def vllm_complete(system_prompt: str, user_prompt: str) -> str:
+    # vLLM's OpenAI-compatible server: continuous batching lets concurrent requests share the GPU
+    url = f"{settings.llm.vllm_base_url}/v1/chat/completions"
+    payload = chat_payload(system_prompt, user_prompt)  # model e.g. "Qwen/Qwen2.5-3B-Instruct-AWQ"
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        r = await client.post(url, headers=JSON_HEADERS, content=payload)
+        if r.status_code >= 300:
+            raise LLMError(f"vLLM error {r.status_code}: {r.text}")
+        data = r.json()
+        return data["choices"][0]["message"]["content"]
+
+
+async def _provider_complete(system_prompt: str, user_prompt: str) -> str:
     if settings.llm.provider == "openai":
         return await openai_complete(system_prompt, user_prompt)
     if settings.llm.provider == "openrouter":
         return await openrouter_complete(system_prompt, user_prompt)
     if settings.llm.provider == "ollama":
         return await ollama_complete(system_prompt, user_prompt)
+    if settings.llm.provider == "vllm":
+        return await vllm_complete(system_prompt, user_prompt)
     raise LLMError(f"Unsupported LLM_PROVIDER: {settings.llm.provider}")
+
+
+async def _complete_and_cache(key: CompletionKey, system_prompt: str, user_prompt: str) -> str:
+    out = await _provider_complete(system_prompt, user_prompt)
+    if out:
+        _responses[key] = (out, time.monotonic() + RESPONSE_TTL_S)
+        if len(_responses) > RESPONSE_CACHE_SIZE:
+            _responses.popitem(last=False)
+    return out
+
+
+def _completion_key(system_prompt: str, user_prompt: str) -> CompletionKey:
+    return settings.llm.provider, settings.llm.model, system_prompt, user_prompt
+
+
+def forget_completion(system_prompt: str, user_prompt: str) -> None:
+    """ Drop a cached answer that turned out to be bad (failed validation/execution) """
+    _responses.pop(_completion_key(system_prompt, user_prompt), None)
+
+
+async def complete(system_prompt: str, user_prompt: str, cache: bool = True) -> str:
+    """
+    Finished completions are served from an in-process LRU cache with a TTL.
+    Concurrent identical prompts are coalesced into one upstream call:
+    the first caller sends the request, the others await the same future.
+    cache=False always asks the provider (retries must not get the same answer back)
+    """
+    if not cache:
+        return await _provider_complete(system_prompt, user_prompt)
+
+    key = _completion_key(system_prompt, user_prompt)
+    if (cached := _responses.get(key)) is not None:
+        out, expires_at = cached
+        if expires_at > time.monotonic():
+            _responses.move_to_end(key)
+            return out
+        del _responses[key]
+    if (pending := _inflight.get(key)) is not None:
+        return await asyncio.shield(pending)
+
+    task = asyncio.ensure_future(_complete_and_cache(key, system_prompt, user_prompt))
+    _inflight[key] = task
+    try:
+        # shield: a cancelled caller must not cancel the request shared with the others
+        return await asyncio.shield(task)
+    finally:
+        if _inflight.get(key) is task:
+            del _inflight[key]
@@ -4,13 +4,14 @@ from pathlib import Path
 from typing import Optional
 
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 
-from src.chain import nl_to_sql, make_plan, refine
+from src.chain import nl_to_sql, forget_nl_to_sql, make_plan, refine, clear_schema_cache
 from src.config import settings
 from src.dbt_generator import generate_dbt_model, materialize_files_to_disk
 from src.dq import run_checks, render_markdown_report, fetch_table_sample, profile_df
-from src.github_client import create_branch, upsert_file, create_pull_request, GitHubError
+from src.github_client import create_branch, commit_files, create_pull_request, GitHubError
 from src.metrics import PrometheusLocalRegistry
 from src.orchestrator import run_flow, get_status
 from src.schema_docs import write_schema_docs
@@ -46,9 +47,13 @@ async def chat(inp: ChatIn):
 
     sql = extract_sql_from_markdown(sql_md)
     try:
-        plan, preview = sql_run(sql)
-    except IncorrectQuestionError as err:
-        raise HTTPException(400, err.args[0]) from err
+        plan, preview = await run_in_threadpool(sql_run, sql)
+    except Exception as err:
+        # A rejected or failing SQL must not be served from the completion cache on the next try
+        forget_nl_to_sql(inp.question, settings.sql.row_limit)
+        if isinstance(err, IncorrectQuestionError):
+            raise HTTPException(400, err.args[0]) from err
+        raise
 
     return ChatOut(sql=sql, plan=plan, rows=preview.to_dict(orient="records"))
 
@@ -121,7 +126,7 @@ async def chat_agent(inp: AgentIn):
 
         try:
             t3 = time.perf_counter()
-            plan_text, preview = sql_run(sql)
+            plan_text, preview = await run_in_threadpool(sql_run, sql)
             exec_ms = int((time.perf_counter() - t3) * 1000)
             exec_ms_acc += exec_ms
             recs = preview.to_dict(orient="records")
@@ -160,7 +165,7 @@ async def chat_agent(inp: AgentIn):
             if c.reason.startswith("ok"):
                 chosen_sql = c.sql
                 try:
-                    _, preview = sql_run(chosen_sql)
+                    _, preview = await run_in_threadpool(sql_run, chosen_sql)
                     rows = preview.to_dict(orient="records")
                 except Exception:
                     rows = []
@@ -208,7 +213,9 @@ async def dbt_generate(inp: DbtGenIn):
     }
     written_paths = None
     if inp.write:
-        written_paths = materialize_files_to_disk(settings.git.dbt_dir, model_name, model_sql, schema_yml)
+        written_paths = await run_in_threadpool(
+            materialize_files_to_disk, settings.git.dbt_dir, model_name, model_sql, schema_yml
+        )
     return DbtGenOut(model_name=model_name, files=files, written_paths=written_paths)
 
 
@@ -232,7 +239,7 @@ async def dbt_preview(inp: DbtPreviewIn):
         # грубая замена последнего LIMIT — для простоты оставим базовую реализацию
         sql_validated = re.sub(r"(?i)\blimit\s+\d+\s*$", f"LIMIT {inp.limit_override}",
                                sql_validated.strip())  # type: ignore
-    plan, preview = sql_run(sql_validated)
+    plan, preview = await run_in_threadpool(sql_run, sql_validated)
     return DbtPreviewOut(plan=plan, rows=preview.to_dict(orient="records"))
 
 
@@ -255,15 +262,11 @@ async def dbt_pr(inp: DbtPRIn):
     try:
         # создаём/проверяем ветку
         await create_branch(inp.branch, from_branch=inp.base or settings.git.default_branch)
-        committed: dict[str, str] = {}
-        for path, body in inp.files.items():
-            r = await upsert_file(
-                path=path,
-                content=body,
-                branch=inp.branch,
-                message=f"chore(dbt): add/update {path}",
-            )
-            committed[path] = r.get("content", {}).get("sha", "ok")
+        # One commit for all files
+        commit_sha = await commit_files(
+            inp.files, branch=inp.branch, message=f"chore(dbt): add/update {', '.join(inp.files)}"
+        )
+        committed = dict.fromkeys(inp.files, commit_sha)
         pr = await create_pull_request(
             title=inp.title,
             head=inp.branch,
@@ -289,8 +292,10 @@ class DQProfileOut(BaseModel):
 @chat_router.post("/dq/profile", response_model=DQProfileOut)
 async def dq_profile(inp: DQProfileIn):
     PrometheusLocalRegistry.inc("dq_requests_total", {"route": "profile"})
-    df = fetch_table_sample(inp.table, where=inp.where, limit=inp.limit or settings.data_quality.default_limit)
-    prof = profile_df(df)
+    df = await run_in_threadpool(
+        fetch_table_sample, inp.table, where=inp.where, limit=inp.limit or settings.data_quality.default_limit
+    )
+    prof = await run_in_threadpool(profile_df, df)
     return DQProfileOut(
         profile=prof,
         sample_rows=df.head(min(len(df), 20)).to_dict(orient="records"),
@@ -323,7 +328,8 @@ class DQCheckOut(BaseModel):
 @chat_router.post("/dq/check", response_model=DQCheckOut)
 async def dq_check(inp: DQCheckIn):
     PrometheusLocalRegistry.inc("dq_requests_total", {"route": "check"})
-    prof, results, sample = run_checks(
+    prof, results, sample = await run_in_threadpool(
+        run_checks,
         table=inp.table,
         where=inp.where,
         rules=[r.model_dump() for r in inp.rules],
@@ -348,11 +354,8 @@ class SchemaRefreshOut(BaseModel):
 
 @chat_router.post("/schema/refresh", response_model=SchemaRefreshOut)
 async def schema_refresh():
-    path = write_schema_docs()
-    try:
-        load_schema_docs.cache_clear()  # type: ignore[attr-defined]
-    except Exception:
-        pass
+    path = await run_in_threadpool(write_schema_docs)
+    clear_schema_cache()
     p = Path(path)
     return SchemaRefreshOut(schema_docs_path=path, size_bytes=p.stat().st_size if p.exists() else 0)
 
@@ -4,10 +4,11 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 
 from src.config import DemoDataPath
-from src.database.base_model import depends_object
+from src.database.base_model import DatabaseObject, depends_object
 from src.database.db_connector import ConnectionType, opened_connection
+from src.database.ingest import bulk_load
 from src.database.models import Namespace, NamespaceNameModel, NamespaceFullModel, NamespaceCreateModel, Table, \
-    TableFullModel
+    TableFullModel, TableLoadedModel
 from src.route.inspect_schema import Message
 from src.route.namespace_table import table_router, get_namespace_depends
 from src.utils import normalize_schema_name
@@ -125,64 +126,53 @@ async def upload_demo_models(
     connection.execute(f"CREATE SCHEMA IF NOT EXISTS {schema_name}")
     connection.commit()
 
-    namespace = namespace_obj.insert(
-        NamespaceCreateModel(
-            name=namespace_name,
-            schema_name=schema_name
+    # Все таблицы и метаданные загружаются одной транзакцией: либо весь демо-набор, либо ничего
+    with DatabaseObject.transaction(connection):
+        namespace = namespace_obj.insert(
+            NamespaceCreateModel(
+                name=namespace_name,
+                schema_name=schema_name
+            )
         )
-    )
-
-    created_tables = []
-    files_processed = 0
-
-    # Обрабатываем каждый CSV файл
-    for csv_file in csv_files:
-        table_name = csv_file.stem  # имя файла без расширения
 
-        # Читаем CSV файл
-        try:
-            data_frame = pd.read_csv(csv_file)
-        except Exception as e:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Error reading CSV file {csv_file.name}: {str(e)}"
+        loaded_tables: list[TableLoadedModel] = []
+
+        # Обрабатываем каждый CSV файл
+        for csv_file in csv_files:
+            table_name = csv_file.stem  # имя файла без расширения
+
+            # Создаем таблицу напрямую из CSV нативным ридером DuckDB (без промежуточного DataFrame)
+            try:
+                bulk_load(connection, f"{schema_name}.{table_name}", csv_file)
+            except Exception as e:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Error loading CSV file {csv_file.name} into {table_name}: {str(e)}"
+                )
+
+            # Пустой CSV (только заголовок) не регистрируем
+            if not connection.execute(f"SELECT count(*) FROM {schema_name}.{table_name}").fetchone()[0]:
+                connection.execute(f"DROP TABLE {schema_name}.{table_name}")
+                continue
+
+            loaded_tables.append(
+                TableLoadedModel(
+                    name=table_name,
+                    namespace_id=namespace.id,
+                    table_name=table_name,
+                    file_name=csv_file.name,
+                    file_size=csv_file.stat().st_size,
+                )
             )
 
-        if data_frame.empty:
-            continue
-
-        # Создаем таблицу в базе данных
-        try:
-            connection.execute(f"""
-                CREATE OR REPLACE TABLE {schema_name}.{table_name} AS 
-                SELECT * FROM data_frame
-            """)
-            connection.commit()
-        except Exception as e:
+        if not (files_processed := len(loaded_tables)):
             raise HTTPException(
-                status_code=500,
-                detail=f"Error creating table {table_name}: {str(e)}"
-            )
-
-        # Записываем информацию о таблице в метаданные
-        table_record = table_obj.insert(
-            TableCreateModel(
-                namespace_id=namespace.id,
-                table_name=table_name,
-                file_name=csv_file.name,
-                file_size=csv_file.stat().st_size,
-                is_loaded=True
+                status_code=400,
+                detail="No valid CSV files were processed"
             )
-        )
 
-        created_tables.append(table_record)
-        files_processed += 1
-
-    if files_processed == 0:
-        raise HTTPException(
-            status_code=400,
-            detail="No valid CSV files were processed"
-        )
+        # Информация о таблицах записывается в метаданные одним INSERT
+        created_tables = table_obj.insert_many(loaded_tables)
 
     return DemoUploadResponse(
         message=f"Successfully uploaded {files_processed} demo tables to namespace '{namespace_name}'",
@@ -8,6 +8,7 @@ from starlette import status
 
 from src.database.base_model import depends_object
 from src.database.db_connector import ConnectionType, opened_connection
+from src.database.ingest import bulk_load
 from src.database.models import Table, NamespaceNameModel, NamespaceFullModel, TableFullModel, TablePartModel, Namespace
 from src.route.inspect_schema import Message
 from src.utils import normalize_schema_name, validate_csv_file
@@ -102,10 +103,7 @@ async def upload_table_file(
     table.file_size = len(byte_data)
 
     data_frame = pd.read_csv(io.BytesIO(byte_data))
-    connection.execute(f"""
-        CREATE OR REPLACE TABLE {namespace.schema_name}.{table.table_name} AS 
-        SELECT * FROM data_frame
-    """)
+    bulk_load(connection, f"{namespace.schema_name}.{table.table_name}", data_frame)
     connection.commit()
 
     table.is_loaded = True
@@ -1,9 +1,8 @@
 from pathlib import Path
 from typing import List, Dict
 
-import duckdb
-
 from src.config import settings
+from src.database.db_connector import duckdb_cursor
 
 EVENTS_DESCR: Dict[str, str] = {
     "event_id": "Unique event identifier (surrogate PK-like)",
@@ -17,12 +16,6 @@ EVENTS_DESCR: Dict[str, str] = {
 }
 
 
-def _con():
-    con = duckdb.connect(settings.data.data_dir / settings.database.file_name)
-    con.execute("SET threads TO 2; SET memory_limit='512MB';")
-    return con
-
-
 def _list_tables(con) -> List[str]:
     q = "SELECT table_name FROM information_schema.tables WHERE table_schema = 'main' ORDER BY 1"
     return [r[0] for r in con.execute(q).fetchall()]
@@ -33,8 +26,8 @@ def _table_info(con, table: str):
 
 
 def build_markdown() -> str:
-    con = _con()
-    try:
+    # A cursor of the process-wide database, not a second duckdb.connect() handle on the file
+    with duckdb_cursor() as con:
         tables = _list_tables(con)
         lines: List[str] = []
         lines.append("# Data Warehouse Schema (auto-generated)\n")
@@ -54,8 +47,6 @@ def build_markdown() -> str:
                 lines.append(f"| {col} | {typ} | {pk} | {nn} | {descr} |")
             lines.append("")
         return "\n".join(lines).strip() + "\n"
-    finally:
-        con.close()
 
 
 def write_schema_docs(path: Path | None = None) -> str:
@@ -2,7 +2,7 @@ import logging
 
 from src.config import settings
 from src.database import create_all
-from src.database.db_connector import create_connection, ConnectionCM
+from src.database.db_connector import create_connection, ConnectionCM, wait_db_connection
 
 logging.basicConfig(
     level=settings.logging.level,
@@ -13,5 +13,5 @@ logging.basicConfig(
 
 if __name__ == '__main__':
     db_connection = create_connection()
-    db_connection.test_db_connection()
+    wait_db_connection(db_connection)
     create_all(ConnectionCM(db_connection), with_drop=True)
@@ -1,8 +1,7 @@
 import re
 
-import duckdb
-
 from src.config import settings
+from src.database.db_connector import duckdb_cursor
 
 SELECT_ONLY = re.compile(r"^\s*SELECT\b", re.IGNORECASE | re.DOTALL)
 FORBIDDEN = re.compile(
@@ -10,6 +9,8 @@ FORBIDDEN = re.compile(
     re.IGNORECASE
 )
 
+PREVIEW_ROWS = 20
+
 
 class IncorrectQuestionError(Exception):
     """ Returning on incorrect input question string """
@@ -53,11 +54,9 @@ def is_safe(sql: str) -> tuple[bool, str]:
 
 def sql_run(outer_sql: str):
     sql = validate_sql(outer_sql)
-    con = duckdb.connect(settings.data.data_dir / settings.database.file_name)
-    con.execute(f"SET threads TO 2; SET memory_limit='512MB';")
-    plan = con.execute("EXPLAIN " + sql).fetchdf()
-    df = con.execute(sql).fetchdf()
-    con.close()
-    # preview
-    preview = df.head(min(len(df), 20))
+    # Native cursor on the process-wide DuckDB: no file re-open; threads/memory_limit caps are database.* settings
+    with duckdb_cursor() as con:
+        plan = con.execute("EXPLAIN " + sql).fetchdf()
+        # preview: the limit is pushed into DuckDB's plan, only PREVIEW_ROWS rows are produced and converted
+        preview = con.sql(sql).limit(PREVIEW_ROWS).df()
     return plan.to_string().strip(), preview